@@ -1,16 +1,31 @@
 # coding=utf-8
-import copy
+import mmap
 import os
+import threading
 from collections import namedtuple
-from struct import Struct, unpack
+from functools import partial
+from struct import Struct
 
+import numpy as np
+
+from constants import events
+from lib.cache import get_cache
+from lib.config import app_config
+from lib.event import trigger
+from lib.jobs import check_cancelled
 from lib.log import get_logger
+from lib.pool import thread_pool
 from lib.i18n import gettext as _
-from ui.frames.progress import progress_tick, progress_new, progress_release
+from lib.progress import progress_tick, progress_new, progress_release
 
 
 logger = get_logger('dsp.data')
 
+DEFAULT_DATA_CONFIG = {
+    'data_mmap_threshold': 64 * 1024 * 1024,   # files bigger than this are memory-mapped
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_DATA_CONFIG)
+
 DATA_FILE_TYPE = '.bin'
 DATA_GROUP_TYPE = '.txt'
 SOURCE_DATA_TYPES = {
@@ -35,6 +50,8 @@ HEADER_DATA_FORMAT = (
     'f'     # минимальное значение принятых данных: 4 байта, вещественное (минимальное значение  сигнала)
     # далее идут данные в формате 4 байта, вещественное число для одного дискретного значения сигнала.
     )
+HEADER_STRUCT = Struct(HEADER_DATA_FORMAT)
+SAMPLE_DTYPE = np.dtype(np.float32)
 
 SignalHeader = namedtuple('SignalHeader', (
     'signature',
@@ -56,38 +73,87 @@ CONSTS = (_('signature'), _('channel_count'), _('fetch_size_per_channel'), _('sp
           _('freq_dimension'), _('rcv_time'), _('total_rcv_time'), _('blocks_count'), _('data_size'),
           _('system_rcved_blocks'), _('max_value'), _('min_value'))
 
+def decode_samples(data, offset=HEADER_STRUCT.size):
+    """
+    Returns float32 samples of TMB1 ``data`` as a read-only numpy array.
+    The array shares memory with ``data``, no per-sample copies are made.
+    """
+    count = (len(data) - offset) / SAMPLE_DTYPE.itemsize
+    return np.frombuffer(data, dtype=SAMPLE_DTYPE, count=max(count, 0), offset=offset)
+
+
 class SignalData(object):
-    def __init__(self, file_name=None):
-        self.file_name = file_name
+    """
+    Channel data of one TMB1 file.
 
-        if self.file_name:
-            with open(self.file_name, 'rb') as f:
-                self.data = f.read()
+    ``lazy`` maps the file into memory instead of reading it: only the header is
+    parsed on open, pages of ``float_data`` are touched on first access.
+    By default files bigger than ``data_mmap_threshold`` are opened lazily.
+
+    Samples of files read eagerly are stored in the decode cache (see ``lib.cache``),
+    next time they are loaded from the cache memory-mapped.
+    """
+    CACHE_KIND = 'samples'
 
-            header = Struct(HEADER_DATA_FORMAT)
-            self.header = SignalHeader(*header.unpack(self.data[:header.size]))
-            self.raw_signal = self.data[header.size:]
+    def __init__(self, file_name=None, lazy=None):
+        self.file_name = file_name
+        self.lazy = lazy
 
-            self.float_data = [unpack('f', self.raw_signal[i:i+4])[0] for i in xrange(0, len(self.raw_signal)-4, 4)]
+        if self.file_name:
+            if not self._load_cached():
+                self._load_file()
 
             logger.info(_('File is loaded: %s') % file_name)
             logger.info(_('File info: %s') % repr(self.header))
-            progress_tick()
+
+    def _load_cached(self):
+        cache = get_cache()
+        cached = cache and cache.get(self.file_name, self.CACHE_KIND)
+        if not cached:
+            return False
+
+        meta, arrays = cached
+        self.lazy = True
+        self.header = SignalHeader(*meta['header'])
+        self.float_data = arrays['samples']
+        self.data = None
+        self.raw_signal = buffer(self.float_data)
+        return True
+
+    def _load_file(self):
+        with open(self.file_name, 'rb') as f:
+            if self.lazy is None:
+                self.lazy = os.fstat(f.fileno()).st_size > app_config.data_mmap_threshold
+            if self.lazy:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = f.read()
+
+        self.header = SignalHeader(*HEADER_STRUCT.unpack(self.data[:HEADER_STRUCT.size]))
+        self.raw_signal = buffer(self.data, HEADER_STRUCT.size)
+        self.float_data = decode_samples(self.data)
+
+        # mapped files are not decoded at all, so there is nothing to cache
+        cache = get_cache()
+        if cache and not self.lazy:
+            cache.put(self.file_name, self.CACHE_KIND, {'samples': self.float_data}, {
+                'header': tuple(self.header),
+            })
 
     def clone(self):
+        # samples are read-only, so the clone shares buffers with the origin
         obj = SignalData()
         obj.file_name = self.file_name
-        obj.data = copy.copy(self.data)
-        obj.header = copy.copy(self.header)
-        obj.raw_signal = copy.copy(self.raw_signal)
-        obj.float_data = copy.copy(self.float_data)
+        obj.lazy = self.lazy
+        obj.data = self.data
+        obj.header = self.header
+        obj.raw_signal = self.raw_signal
+        obj.float_data = self.float_data
 
         return obj
 
     def slice(self, first, last):
-        obj = self.clone()
-        obj.float_data = obj.float_data[first:last]
-        return obj
+        return SignalSlice(self, first, last)
 
     def to_time(self, value_position):
         value_position = int(round(value_position))
@@ -104,15 +170,113 @@ class SignalData(object):
         return self.file_name
 
 
+class SignalSlice(SignalData):
+    """
+    Window ``[first, last)`` over samples of ``signal``.
+
+    It shares header and sample buffer with the origin signal and keeps only
+    the offset, so slicing costs O(1). Slice of a slice refers to the origin directly.
+    """
+    def __init__(self, signal, first, last):
+        origin = signal.origin if isinstance(signal, SignalSlice) else signal
+        first, last, _step = slice(first, last).indices(len(signal.float_data))
+
+        self.origin = origin
+        self.offset = getattr(signal, 'offset', 0) + first
+        self.file_name = origin.file_name
+        self.lazy = origin.lazy
+        self.data = origin.data
+        self.header = origin.header
+        self.raw_signal = origin.raw_signal
+        self.float_data = origin.float_data[self.offset:self.offset + max(last - first, 0)]
+
+    def clone(self):
+        return SignalSlice(self.origin, self.offset, self.offset + len(self.float_data))
+
+    def to_time(self, value_position):
+        return self.origin.to_time(self.offset + value_position)
+
+
+class SignalStream(object):
+    """
+    Reads samples of a TMB1 file block by block keeping memory bounded.
+
+    Example:
+        >>> with SignalStream(file_name) as stream:
+        ...     for block in stream.blocks():
+        ...         spectrum = np.fft.rfft(block)
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        self.header = SignalHeader(*HEADER_STRUCT.unpack(self.file.read(HEADER_STRUCT.size)))
+        self.samples_count = (os.fstat(self.file.fileno()).st_size - HEADER_STRUCT.size) / SAMPLE_DTYPE.itemsize
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def read(self, position, count):
+        """Reads ``count`` samples starting from ``position``"""
+        self.file.seek(HEADER_STRUCT.size + position * SAMPLE_DTYPE.itemsize)
+        return np.fromfile(self.file, dtype=SAMPLE_DTYPE, count=max(min(count, self.samples_count - position), 0))
+
+    def blocks(self, size=None, start=0, stop=None):
+        """
+        Yields consecutive float32 blocks of ``size`` samples (``fetch_size_per_channel`` by default).
+        The last block may be shorter.
+        """
+        size = size or self.header.fetch_size_per_channel
+        stop = self.samples_count if stop is None else min(stop, self.samples_count)
+        position = start
+        while position < stop:
+            block = self.read(position, min(size, stop - position))
+            if not len(block):
+                break
+            yield block
+            position += len(block)
+
+    def windows(self, size, step=None, start=0, stop=None, chunk_size=None):
+        """
+        Yields windows of ``size`` samples every ``step`` samples, windows overlap if ``step < size``.
+        Incomplete tail window is dropped. Windows are views on an internal buffer:
+        copy them if they have to outlive the iteration step.
+        """
+        step = step or size
+        chunk_size = max(chunk_size or self.header.fetch_size_per_channel, size)
+        buf, position = np.empty(0, dtype=SAMPLE_DTYPE), 0
+        for block in self.blocks(chunk_size, start=start, stop=stop):
+            if position >= len(buf):
+                buf, position = block, position - len(buf)
+            else:
+                buf, position = np.concatenate((buf[position:], block)), 0
+            while position + size <= len(buf):
+                yield buf[position:position + size]
+                position += step
+
+
 class SignalsDataSet(list):
-    def __init__(self, files=None, *args, **kwargs):
+    def __init__(self, files=None, lazy=None, *args, **kwargs):
         super(SignalsDataSet, self).__init__(*args, **kwargs)
         if files:
+            # files are read concurrently, results come in the bundle order
             progress_new(len(files))
-            self.extend([SignalData(f) for f in files])
-            progress_release()
+            try:
+                for signal_data in thread_pool().imap(partial(SignalData, lazy=lazy), files):
+                    check_cancelled()
+                    self.append(signal_data)
+                    progress_tick()
+            finally:
+                progress_release()
 
         self.signals = self
+        self._matrix = None
+        self._matrix_lock = threading.Lock()
 
     def slice(self, first, last):
         obj = SignalsDataSet()
@@ -125,9 +289,41 @@ class SignalsDataSet(list):
     def pluck(self, attr):
         return (getattr(data.header, attr, None) for data in self.signals)
 
+    def lengths(self):
+        return np.array([len(data.float_data) for data in self.signals], dtype=np.intp)
+
+    @staticmethod
+    def _same_signals(key, other):
+        return len(key) == len(other) and all(a is c and b is d for (a, b), (c, d) in zip(key, other))
 
+    def matrix(self):
+        """
+        Returns channels x samples float32 masked array of the data set.
+        Tails of channels shorter than the longest one are masked.
+        The matrix is built once and rebuilt only if the set of signals changes.
 
-def data_factory(file_name):
+        It's an in-memory copy of all samples, so it's for callers which need
+        whole channels at once; mapped files are better read by slices of ``float_data``.
+        """
+        # the key keeps references, so it can't match new objects at reused addresses
+        key = [(data, data.float_data) for data in self.signals]
+        with self._matrix_lock:
+            if self._matrix is None or not self._same_signals(self._matrix[0], key):
+                lengths = self.lengths()
+                width = lengths.max() if len(lengths) else 0
+                matrix = np.zeros((len(lengths), width), dtype=SAMPLE_DTYPE)
+                for row, data in zip(matrix, self.signals):
+                    row[:len(data.float_data)] = data.float_data
+
+                mask = np.ma.nomask
+                if (lengths != width).any():
+                    mask = np.arange(width)[np.newaxis, :] >= lengths[:, np.newaxis]
+                self._matrix = key, np.ma.array(matrix, mask=mask)
+            return self._matrix[1]
+
+
+
+def data_factory(file_name, lazy=None):
     files = []
     if file_name.endswith(DATA_FILE_TYPE):
         files.append(file_name)
@@ -142,4 +338,60 @@ def data_factory(file_name):
                     continue
                 files.append(line)
 
-    return SignalsDataSet(files=files)
+    return SignalsDataSet(files=files, lazy=lazy)
+
+
+SETUP_FILE_NAME = 'TIP_D.ANL'
+SETUP_FILE_ENCODING = 'cp866'
+
+class AnalysisSetup(namedtuple('AnalysisSetup', 'mechanism base_frequency coefficients band_boundaries')):
+    """Setup of harmonic analysis of a mechanism. Frequencies are in Hz"""
+    @property
+    def frequencies(self):
+        """Informative frequencies: base frequency multiplied by the coefficients"""
+        return [self.base_frequency * coefficient for coefficient in self.coefficients]
+
+    @property
+    def bands(self):
+        """[(low, high)] frequency bands"""
+        return zip(self.band_boundaries[:-1], self.band_boundaries[1:])
+
+
+def read_setup(file_name):
+    """
+    Reads analysis setup file (TIP_D.ANL). It's a cp866 text:
+        Файл настроечных данных
+        Механизм <name>
+        <base frequency> - Базовая частота
+        <N> - Количество информативных частот
+        N lines: <coefficient> - коэф. частоты <i> = <frequency> Hz
+        <M> - Количество разбиений на диапазоны
+        lines: <frequency> - граница <j>, the first M + 1 of them are boundaries of M bands
+    Raises ValueError if the file has another format.
+    """
+    with open(file_name, 'rb') as f:
+        lines = [line.strip() for line in f.read().decode(SETUP_FILE_ENCODING).splitlines()]
+    lines = [line for line in lines if line]
+    try:
+        mechanism = (lines[1].split(None, 1) + [u''])[1]
+        values = [float(line.partition(u' - ')[0]) for line in lines[2:]]
+        base_frequency, count = values[0], int(values[1])
+        coefficients = values[2:2 + count]
+        bands_count = int(values[2 + count])
+        band_boundaries = values[3 + count:4 + count + bands_count]
+    except (IndexError, ValueError):
+        raise ValueError('Wrong setup file: %s' % file_name)
+    if len(coefficients) != count or len(band_boundaries) != bands_count + 1:
+        raise ValueError('Wrong setup file: %s' % file_name)
+    return AnalysisSetup(mechanism, base_frequency, coefficients, band_boundaries)
+
+def find_setup(file_name):
+    """Returns AnalysisSetup stored next to the data file or bundle ``file_name`` or None"""
+    setup_file = os.path.join(os.path.dirname(file_name), SETUP_FILE_NAME)
+    if not os.path.exists(setup_file):
+        return None
+    try:
+        return read_setup(setup_file)
+    except ValueError as e:
+        logger.warning(unicode(e))
+        return None
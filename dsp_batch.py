@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+DSP - Digital Signal Processing
+
+=> headless batch processing: computes features of every recording
+   (``*_collfile.txt`` bundle) found in a directory tree. Recordings with
+   an analysis setup (TIP_D.ANL) next to them get harmonic trend tables too,
+   features of sliding windows (RMS, peak, dominant frequency) go to the trends table,
+   transients found in all channels of a bundle go to the transients table.
+
+Example:
+    $ python dsp_batch.py /data/recordings -o /data/features -p 8
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from lib.log import setup as setup_logging
+setup_logging(level=logging.INFO)
+
+from data import DATA_GROUP_TYPE, data_factory, find_setup
+from lib.config import app_config
+from lib.i18n import gettext as _
+from lib.log import get_logger
+from lib.pool import process_pool
+from processing.harmonics import harmonics
+from processing.spectrum import signal_frequency, welch_psd
+from processing.stats import Stats, signal_stats
+from processing.transients import get_transients
+from processing.trends import feature_trends
+from processing.wavelets import dwt_levels
+
+
+logger = get_logger('dsp.batch')
+
+BUNDLE_SUFFIX = '_collfile' + DATA_GROUP_TYPE
+FORMATS = ('csv', 'npz')
+TABLES = ('features', 'harmonics', 'bands', 'trends', 'transients')
+
+
+def find_bundles(root):
+    """Yields paths of all bundles in the ``root`` tree, in sorted order"""
+    for path, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(BUNDLE_SUFFIX):
+                yield os.path.join(path, name)
+
+
+def wavelet_energies(samples, levels, wavelet, mode):
+    """Energy of detail coefficients of every decomposition level"""
+    import pywt
+    levels = min(levels, pywt.dwt_max_level(len(samples), pywt.Wavelet(wavelet).dec_len))
+    return [float(np.dot(detail, detail)) for approximation, detail in dwt_levels(samples, levels, wavelet, mode)]
+
+def harmonic_rows(bundle, signal, setup, options):
+    """Rows of harmonics and bands tables: one per block and harmonic (band)"""
+    result = harmonics(signal.file_name, setup.frequencies, setup.bands, block_size=options.block, window=options.window)
+    harmonics_table, bands_table = [], []
+    for block_time, amplitudes, band_rms in zip(result.times, result.amplitudes, result.band_rms):
+        for i, (frequency, amplitude) in enumerate(zip(result.frequencies, amplitudes)):
+            harmonics_table.append(dict(bundle=bundle, file_name=signal.file_name, time=block_time,
+                harmonic=i + 1, frequency=frequency, amplitude=amplitude))
+        for i, ((low, high), rms) in enumerate(zip(result.bands, band_rms)):
+            bands_table.append(dict(bundle=bundle, file_name=signal.file_name, time=block_time,
+                band=i + 1, low=low, high=high, rms=rms))
+    return harmonics_table, bands_table
+
+def trend_rows(bundle, signal, options):
+    """Rows of trends table: one per sliding window"""
+    result = feature_trends(signal.float_data, signal_frequency(signal),
+        size=options.trend_window, step=options.trend_step, window=options.window)
+    return [dict(bundle=bundle, file_name=signal.file_name, time=window_time, rms=rms, peak=peak, crest=crest,
+                 dominant_frequency=frequency) for window_time, rms, peak, crest, frequency in zip(*result)]
+
+def transient_rows(bundle, signals):
+    """Rows of transients table: one per transient of the bundle"""
+    result = get_transients(signals)
+    fq = signal_frequency(signals[0]) if signals else 1.0
+    return [dict(bundle=bundle, offset=offset, duration=duration, time=offset / fq, peak=peak)
+            for offset, duration, peak in zip(*result)]
+
+def process_bundle(args):
+    """
+    Computes features of every channel of the bundle. It's run by the process pool.
+    Returns ``(bundle, tables, spectra, error)``, ``tables`` is a dict of
+    table name -> rows, row is a dict of column -> value.
+    """
+    bundle, options = args
+    tables = dict((name, []) for name in TABLES)
+    spectra = []
+    setup = find_setup(bundle) if options.harmonics else None
+    try:
+        signals = data_factory(bundle, lazy=True)
+        if options.transients:
+            tables['transients'].extend(transient_rows(bundle, signals))
+        for signal in signals:
+            frequencies, psd, count = welch_psd(signal.file_name, size=options.nfft,
+                overlap=options.overlap, window=options.window)
+            stats = signal_stats(signal.float_data) or Stats(*([0] * len(Stats._fields)))
+            row = dict(stats._asdict(), bundle=bundle, file_name=signal.file_name,
+                frequency=signal_frequency(signal), psd_windows=count)
+            energies = wavelet_energies(signal.float_data, options.wavelet_levels, options.wavelet, options.wavelet_mode)
+            for level in xrange(options.wavelet_levels):
+                row['wavelet_energy_%d' % (level + 1)] = energies[level] if level < len(energies) else np.nan
+            tables['features'].append(row)
+            spectra.append(psd)
+
+            if setup is not None:
+                harmonics_rows, bands_rows = harmonic_rows(bundle, signal, setup, options)
+                tables['harmonics'].extend(harmonics_rows)
+                tables['bands'].extend(bands_rows)
+            if options.trends:
+                tables['trends'].extend(trend_rows(bundle, signal, options))
+    except Exception as e:
+        logger.exception(_('Bundle is not processed: %s') % bundle)
+        return bundle, dict((name, []) for name in TABLES), [], unicode(e)
+    return bundle, tables, spectra, None
+
+
+def columns_order(name, options):
+    if name == 'harmonics':
+        return ['bundle', 'file_name', 'time', 'harmonic', 'frequency', 'amplitude']
+    elif name == 'bands':
+        return ['bundle', 'file_name', 'time', 'band', 'low', 'high', 'rms']
+    elif name == 'transients':
+        return ['bundle', 'offset', 'duration', 'time', 'peak']
+    elif name == 'trends':
+        return ['bundle', 'file_name', 'time', 'rms', 'peak', 'crest', 'dominant_frequency']
+    return (['bundle', 'file_name', 'frequency'] + list(Stats._fields) + ['psd_windows'] +
+            ['wavelet_energy_%d' % (level + 1) for level in xrange(options.wavelet_levels)])
+
+def write_table(path, columns, rows, fmt):
+    if fmt == 'csv':
+        with open(path, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([row[c].encode('utf8') if isinstance(row[c], unicode) else row[c] for c in columns])
+    else:
+        np.savez(path, **dict((c, np.array([row[c] for row in rows])) for c in columns))
+
+def write_spectra(path, rows, spectra, options):
+    np.savez(path,
+        file_name=np.array([row['file_name'] for row in rows]),
+        frequency=np.array([row['frequency'] for row in rows]),
+        nfft=options.nfft,
+        psd=np.array(spectra) if spectra else np.zeros((0, options.nfft // 2 + 1)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=_('Computes features of all recordings in a directory tree'))
+    parser.add_argument('root', help=_('directory with *_collfile.txt bundles'))
+    parser.add_argument('-o', '--output', default='.', help=_('directory for result files'))
+    parser.add_argument('-f', '--format', choices=FORMATS, default='csv', help=_('format of the features table'))
+    parser.add_argument('-p', '--processes', type=int, default=None, help=_('number of worker processes'))
+    parser.add_argument('--nfft', type=int, default=1024, help=_('Welch window size'))
+    parser.add_argument('--overlap', type=float, default=0.5, help=_('Welch windows overlap'))
+    parser.add_argument('--window', default='hanning', help=_('window function'))
+    parser.add_argument('--wavelet', default=app_config.draw_wavelet or 'db20')
+    parser.add_argument('--wavelet-mode', default=app_config.draw_wavelet_mode or 'sp1')
+    parser.add_argument('--wavelet-levels', type=int, default=5)
+    parser.add_argument('--no-harmonics', dest='harmonics', action='store_false',
+        help=_('don\'t compute harmonics of recordings with analysis setup files'))
+    parser.add_argument('--block', type=int, default=None,
+        help=_('block size of harmonic analysis, by default it resolves the closest harmonics'))
+    parser.add_argument('--no-trends', dest='trends', action='store_false',
+        help=_('don\'t compute features of sliding windows'))
+    parser.add_argument('--trend-window', type=int, default=app_config.draw_trend_window or 1024,
+        help=_('sliding window size of trends'))
+    parser.add_argument('--trend-step', type=int, default=app_config.draw_trend_step,
+        help=_('sliding window step of trends, a half of the window by default'))
+    parser.add_argument('--no-transients', dest='transients', action='store_false',
+        help=_('don\'t detect transients'))
+    options = parser.parse_args(argv)
+    options.root = options.root.decode(sys.getfilesystemencoding())
+    options.output = options.output.decode(sys.getfilesystemencoding())
+    return options
+
+def main(argv=None):
+    options = parse_args(argv)
+    app_config.pool_processes = options.processes
+    bundles = list(find_bundles(options.root))
+    logger.info(_('Bundles found: %s') % len(bundles))
+
+    started = time.time()
+    tables, spectra, failed = dict((name, []) for name in TABLES), [], 0
+    jobs = [(bundle, options) for bundle in bundles]
+    for i, (bundle, bundle_tables, bundle_spectra, error) in enumerate(process_pool().imap(process_bundle, jobs)):
+        logger.info(u'[%s/%s] %s' % (i + 1, len(bundles), bundle))
+        failed += error is not None
+        for name in TABLES:
+            tables[name].extend(bundle_tables[name])
+        spectra.extend(bundle_spectra)
+
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+    for name in TABLES:
+        if tables[name] or name == 'features':
+            write_table(os.path.join(options.output, '%s.%s' % (name, options.format)),
+                columns_order(name, options), tables[name], options.format)
+    write_spectra(os.path.join(options.output, 'spectra.npz'), tables['features'], spectra, options)
+    logger.info(_('Channels processed: %s, failed bundles: %s, time: %.1fs') % (
+        len(tables['features']), failed, time.time() - started))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
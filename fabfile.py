@@ -46,5 +46,45 @@ def translate(languages=env.languages):
         compile_mo(lang)
 
 
+# Benchmarks
+IMPORT_TIME_SCRIPT = (
+    'import sys, time; started = time.time(); import %(module)s; spent = time.time() - started; '
+    'print "%%-22s %%.3fs  wx: %%-5s matplotlib: %%s" %% ("%(module)s", spent, '
+    '"wx" in sys.modules, "matplotlib" in sys.modules)'
+)
 
+def import_time(modules='data;processing.spectrum;processing.wavelets;processing.stats;visualizer;ui.app'):
+    """Cold import time of modules, each one in a fresh interpreter"""
+    with cd(env.project_root):
+        for module in modules.split(';'):
+            local('python -c \'%s\'' % IMPORT_TIME_SCRIPT % dict(module=module))
 
+def decode_time(path='_test_data', repeat=3):
+    """Per-sample ``unpack`` decoding of TMB1 files vs ``data.decode_samples``"""
+    import time
+    from struct import unpack
+    from data import DATA_FILE_TYPE, HEADER_STRUCT, decode_samples
+
+    def legacy(data):
+        raw = data[HEADER_STRUCT.size:]
+        return [unpack('f', raw[i:i+4])[0] for i in xrange(0, len(raw)-4, 4)]
+
+    def measure(func, data):
+        best = None
+        for _i in xrange(int(repeat)):
+            started = time.time()
+            func(data)
+            spent = time.time() - started
+            best = spent if best is None else min(best, spent)
+        return best
+
+    for root, dirs, files in os.walk(PROJECT_(path)):
+        for name in sorted(files):
+            if not name.endswith(DATA_FILE_TYPE):
+                continue
+            with open(os.path.join(root, name), 'rb') as f:
+                data = f.read()
+            old, new = measure(legacy, data), measure(decode_samples, data)
+            print '%-60s %8d KiB  unpack: %.4fs  numpy: %.6fs  x%.0f' % (
+                os.path.relpath(os.path.join(root, name), env.project_root), len(data) / 1024,
+                old, new, old / max(new, 1e-9))
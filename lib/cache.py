@@ -0,0 +1,207 @@
+# coding=utf-8
+"""
+Caches of computed data.
+
+``LRUCache`` keeps recently used results in memory, ``file_key`` makes keys of
+results derived from files, so they aren't taken after the file is changed.
+
+``FileCache`` is a persistent on-disk cache of arrays derived from source files.
+Entries are keyed by the source file identity: path, size, mtime and a hash
+of the file content (head and tail chunks), so any change of the source file
+invalidates them. Arrays are stored as ``.npy`` files and loaded memory-mapped.
+Total cache size is bounded, least recently used entries are evicted first.
+"""
+__all__ = ['LRUCache', 'FileCache', 'file_key', 'get_cache']
+
+import cPickle as pickle
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from constants import events
+from lib.config import app_config
+from lib.event import trigger
+from lib.i18n import gettext as _
+from lib.log import get_logger
+
+
+logger = get_logger('dsp.cache')
+
+DEFAULT_CACHE_CONFIG = {
+    'cache_enabled': True,
+    'cache_dir': os.path.join(os.path.expanduser('~'), '.dsp', 'cache'),
+    'cache_max_size': 1024 * 1024 * 1024,
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_CACHE_CONFIG)
+
+
+class LRUCache(object):
+    """
+    Thread safe mapping which keeps ``max_size`` recently used values.
+
+    Example:
+        >>> results = LRUCache(max_size=16)
+        >>> tiles = results.get_or_compute(key, SpectrogramTiles, file_name)
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value = self._items[key] = self._items.pop(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        """Returns the value of ``key``, a missed one is ``func(*args, **kwargs)`` computed out of the lock"""
+        value = self.get(key)
+        if value is None:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def file_key(path):
+    """Returns ``(path, size, mtime)`` of the file, ``path`` itself if it's not a file"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return path
+    return path, stat.st_size, stat.st_mtime
+
+
+class FileCache(object):
+    META_FILE = 'meta.pickle'
+    ARRAY_EXT = '.npy'
+    HASH_CHUNK = 64 * 1024
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def identity(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            digest.update(f.read(self.HASH_CHUNK))
+            if stat.st_size > self.HASH_CHUNK:
+                f.seek(max(stat.st_size - self.HASH_CHUNK, self.HASH_CHUNK))
+                digest.update(f.read(self.HASH_CHUNK))
+        return path, stat.st_size, stat.st_mtime, digest.hexdigest()
+
+    def _entry(self, path, kind):
+        path = os.path.abspath(path)
+        if not isinstance(path, unicode):
+            path = path.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+        name = hashlib.sha1((u'%s\0%s' % (path, kind)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def get(self, path, kind):
+        """
+        Returns ``(meta, arrays)`` stored for ``path`` or None if there is no valid entry.
+        """
+        entry = self._entry(path, kind)
+        meta_file = os.path.join(entry, self.META_FILE)
+        try:
+            with open(meta_file, 'rb') as f:
+                identity, meta, names = pickle.load(f)
+            if identity != self.identity(path):
+                self.remove(path, kind)
+                return None
+            arrays = dict((name, np.load(os.path.join(entry, name + self.ARRAY_EXT), mmap_mode='r'))
+                          for name in names)
+            os.utime(meta_file, None)   # mark as recently used
+        except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        return meta, arrays
+
+    def put(self, path, kind, arrays, meta=None):
+        """
+        Stores ``arrays`` (dict of name -> numpy array) and ``meta`` for ``path``.
+        """
+        entry, tmp = self._entry(path, kind), None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            tmp = tempfile.mkdtemp(dir=self.directory)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, name + self.ARRAY_EXT), array)
+            with open(os.path.join(tmp, self.META_FILE), 'wb') as f:
+                pickle.dump((self.identity(path), meta, list(arrays)), f, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                shutil.rmtree(entry, ignore_errors=True)
+                os.rename(tmp, entry)
+        except (IOError, OSError) as e:
+            logger.warning(_('Cache entry is not saved: %s') % e)
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def remove(self, path, kind):
+        shutil.rmtree(self._entry(path, kind), ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta_file = os.path.join(entry, self.META_FILE)
+            if not os.path.exists(meta_file):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            entries.append((os.path.getmtime(meta_file), size, entry))
+        return entries
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits ``max_size``"""
+        with self._lock:
+            try:
+                entries = sorted(self._entries())
+            except OSError:
+                return
+            total = sum(size for used, size, entry in entries)
+            while entries and total > self.max_size:
+                used, size, entry = entries.pop(0)
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_cache = None
+def get_cache():
+    """Returns the application cache or None if it's disabled"""
+    global _cache
+    if not app_config.cache_enabled:
+        return None
+    if _cache is None or _cache.directory != app_config.cache_dir:
+        _cache = FileCache(app_config.cache_dir, app_config.cache_max_size)
+    _cache.max_size = app_config.cache_max_size
+    return _cache
@@ -4,12 +4,36 @@ Docstring
 """
 __all__ = ['Conf', 'app_config']
 
+import threading
+import time
+from contextlib import contextmanager
+
 from constants import events
 from lib.event import app_events
 
 
 class Conf(dict):
+    """
+    Application config. Every change of a parameter triggers ``config:changed``
+    and ``config:<key>:changed`` events.
+
+    Several changes can be collected into one notification per key:
+        >>> with app_config.batch():
+        ...     app_config.draw_page_size = 4000
+        ...     app_config.draw_position = 0
+
+    Notifications about high-rate keys can be debounced:
+        >>> app_config.debounce('draw_position', 0.05)
+    """
     def __init__(self, config=None, events_=app_events, *args, **kwargs):
+        # internal state is kept out of the dict
+        object.__setattr__(self, '_batch_depth', 0)
+        object.__setattr__(self, '_pending', [])
+        object.__setattr__(self, '_debounced', {})  # key -> delay
+        object.__setattr__(self, '_timers', {})     # key -> threading.Timer
+        object.__setattr__(self, '_notified', {})   # key -> time of the last notification
+        object.__setattr__(self, '_lock', threading.Lock())
+
         self.events = events_
         super(Conf, self).__init__(*args, **kwargs)
         self.update(config or {})
@@ -25,8 +49,58 @@ class Conf(dict):
         self.__setattr__(key, value)
 
     def _update(self, config):
-        for k,v in config.items():
-            self.__setattr__(k, v)
+        with self.batch():
+            for k,v in config.items():
+                self.__setattr__(k, v)
+
+    @contextmanager
+    def batch(self):
+        """Notifies about changes made inside the block once per key when the block is left"""
+        object.__setattr__(self, '_batch_depth', self._batch_depth + 1)
+        try:
+            yield self
+        finally:
+            object.__setattr__(self, '_batch_depth', self._batch_depth - 1)
+            if not self._batch_depth and self._pending:
+                keys = self._pending[:]
+                del self._pending[:]
+                self._notify(keys)
+
+    def debounce(self, key, delay):
+        """
+        Limits notifications about ``key`` to one per ``delay`` seconds.
+        A change after a quiet period is notified at once, changes within ``delay``
+        are collapsed into one notification with the latest value. ``delay=None`` removes the limit.
+        """
+        if delay is None:
+            self._debounced.pop(key, None)
+        else:
+            self._debounced[key] = delay
+
+    def _notify(self, keys):
+        self.events.trigger(events.EVENT_CHANGED_CONFIG, config=self)
+        for key in keys:
+            self._notified[key] = time.time()
+            self.events.trigger(events.EVENT_CHANGED_PARAMETER.replace('*', key), key=key, value=self.get(key))
+
+    def _notify_debounced(self, key):
+        with self._lock:
+            self._timers.pop(key, None)
+        self._notify([key])
+
+    def _schedule(self, key):
+        from lib.jobs import call_after
+
+        with self._lock:
+            if key in self._timers:
+                return # the latest value will be taken by the pending notification
+            delay = self._debounced[key] - (time.time() - self._notified.get(key, 0))
+            if delay > 0:
+                timer = self._timers[key] = threading.Timer(delay, call_after, (self._notify_debounced, key))
+                timer.daemon = True
+                timer.start()
+                return
+        self._notify([key])
 
     def __getattr__(self, item):
         return self.get(item)
@@ -35,8 +109,13 @@ class Conf(dict):
         changed = key not in self or (self.get(key) != value)
         self[key] = value
         if changed:
-            self.events.trigger(events.EVENT_CHANGED_CONFIG, config=self)
-            self.events.trigger(events.EVENT_CHANGED_PARAMETER.replace('*', key), key=key, value=value)
+            if self._batch_depth:
+                if key not in self._pending:
+                    self._pending.append(key)
+            elif key in self._debounced:
+                self._schedule(key)
+            else:
+                self._notify([key])
 
 
-app_config = Conf()
\ No newline at end of file
+app_config = Conf()
@@ -3,11 +3,142 @@
 Class to generate custom events
 """
 
+import Queue
 import re
+import threading
+import time
+import weakref
 from itertools import chain
 from functools import partial
 
 
+class WeakHandler(object):
+    """
+    Bound method referencing its object weakly.
+    When the object is collected the handler unbinds itself from ``events``.
+    It's equal to the bound method it's made of, so it can be unbound by the method too.
+    """
+    def __init__(self, method, events=None):
+        self.im_func = method.im_func
+        self._self = weakref.ref(method.im_self, self._on_collected)
+        self._events = weakref.ref(events) if events is not None else None
+        self._hash = hash((id(method.im_self), method.im_func))
+
+    @property
+    def im_self(self):
+        return self._self()
+
+    def _on_collected(self, ref):
+        events = self._events() if self._events is not None else None
+        if events is not None:
+            events.off(None, [self])
+
+    def __call__(self, *args, **kwargs):
+        im_self = self._self()
+        if im_self is not None:
+            return self.im_func(im_self, *args, **kwargs)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        im_self = self._self()
+        return im_self is not None and getattr(other, 'im_self', None) is im_self \
+            and getattr(other, 'im_func', None) is self.im_func
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._hash
+
+
+class QueuedHandler(object):
+    """
+    Handler called asynchronously: calls are put into a bounded queue and
+    delivered in order by ``post(drain)`` - in the main loop or in a worker.
+    When the queue is full a producer waits up to ``timeout`` seconds,
+    then the oldest call is dropped, so producers are never blocked for long.
+    """
+    def __init__(self, handler, post, max_size=1024, timeout=0.1):
+        self.handler = handler
+        self.post = post
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue = Queue.Queue(max_size)
+        self._lock = threading.Lock()
+        self._posted = False
+        self._congested = False
+
+    im_self = property(lambda self: getattr(self.handler, 'im_self', None))
+    im_func = property(lambda self: getattr(self.handler, 'im_func', None))
+
+    def __call__(self, *args, **kwargs):
+        try:
+            # wait for the consumer once, while it's congested the oldest calls are dropped at once
+            if self._congested:
+                self._queue.put_nowait((args, kwargs))
+            else:
+                self._queue.put((args, kwargs), timeout=self.timeout)
+        except Queue.Full:
+            self._congested = True
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except Queue.Empty:
+                pass
+            self._queue.put_nowait((args, kwargs))
+        with self._lock:
+            if self._posted:
+                return
+            self._posted = True
+        self.post(self.drain)
+
+    def drain(self):
+        """Delivers all queued calls"""
+        while True:
+            with self._lock:
+                try:
+                    args, kwargs = self._queue.get_nowait()
+                except Queue.Empty:
+                    self._posted = self._congested = False
+                    return
+            self.handler(*args, **kwargs)
+
+    def __eq__(self, other):
+        if isinstance(other, QueuedHandler):
+            other = other.handler
+        return self.handler == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.handler)
+
+
+class Subscription(object):
+    """
+    Handle returned by ``Events.on``. Unbinds its handlers by ``off`` or on leaving the ``with`` block:
+        >>> with app_events.on('logging:log', handler):
+        ...     do_something()
+    """
+    def __init__(self, events, event_names, handlers):
+        self.events = events
+        self.event_names = event_names
+        self.handlers = handlers
+
+    def off(self):
+        if self.handlers:
+            self.events.off(self.event_names, self.handlers)
+            self.handlers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.off()
+
+
 class Events(dict):
     """
     Allows to organize hierarchical event tree.
@@ -65,6 +196,12 @@ class Events(dict):
     TB_CALL_EVERY = 2
     TB_DEFAULT = TB_CALL_ONCE
 
+    # Handlers delivery
+    DL_CALLER = 1 # in the triggering thread, synchronously
+    DL_MAIN_LOOP = 2 # queued, in the main loop (see lib.jobs.set_dispatcher)
+    DL_WORKER = 3 # queued, in a background worker
+    DL_DEFAULT = DL_CALLER
+
     # To avoid mix kwarg arguments
     KWARGS_PREFIX = 'event_opt_'
 
@@ -72,6 +209,9 @@ class Events(dict):
     def __init__(self, *args, **kwargs):
         super(Events, self).__init__(*args, **kwargs)
         self._re_cache = {}
+        self._dispatch = {} # (events, options) -> handlers to call, reset by on/off
+        self._generation = 0 # counts on/off calls, a resolved list is stored only if it's unchanged
+        self._dispatch_lock = threading.Lock()
 
     def _generate_events(self, event_name, events_scope=ES_PROPAGATE_DEFAULT):
         events = []
@@ -145,6 +285,37 @@ class Events(dict):
         """
         return dict((self.KWARGS_PREFIX+k, v) for k,v in kwargs.items())
 
+    def _handler_key(self, handler):
+        # bound methods of unhashable objects (dicts, e.g. Conf) are unhashable too
+        im_self = getattr(handler, 'im_self', None)
+        if im_self is not None:
+            return id(im_self), handler.im_func
+        try:
+            hash(handler)
+        except TypeError:
+            return id(handler)
+        return handler
+
+    def _resolve(self, events, unique_call, call_order, propagate):
+        """Returns list of handlers to call for ``events`` with given options"""
+        events = self._prepare_events(events)
+        get_handlers_func = partial(self._get_handlers,
+            call_order=call_order,
+            events_scope=propagate
+        )
+        handlers = chain(*map(get_handlers_func, events))
+        if unique_call == self.TB_CALL_EVERY:
+            return list(handlers)
+
+        executed = set()
+        resolved = []
+        for handler in handlers:
+            key = self._handler_key(handler)
+            if key not in executed:
+                executed.add(key)
+                resolved.append(handler)
+        return resolved
+
     def trigger(self, events, *args, **kwargs):
         """
         Important: options should be passed with KWARGS_PREFIX in name.
@@ -154,25 +325,51 @@ class Events(dict):
         call_order = self._option(kwargs, 'call_order', self.CO_DEFAULT)
         propagate = self._option(kwargs, 'propagate', self.ES_PROPAGATE_DEFAULT)
 
-        events = self._prepare_events(events)
-        get_handlers_func = partial(self._get_handlers,
-            call_order=call_order,
-            events_scope=propagate
-        )
-        executed = []
-        results = []
-        for handler in chain(*map(get_handlers_func, events)):
-            if handler not in executed or unique_call == self.TB_CALL_EVERY:
-                results.append(handler(*args, **kwargs))
-                executed.append(handler)
-        return results
-
-    def on(self, event_or_events, handler_or_handlers):
+        key = (events if isinstance(events, basestring) else tuple(events or ()),
+               unique_call, call_order, propagate)
+        handlers = self._dispatch.get(key)
+        if handlers is None:
+            # on/off in another thread could change handlers while they are resolved
+            generation = self._generation
+            handlers = self._resolve(events, unique_call, call_order, propagate)
+            with self._dispatch_lock:
+                if generation == self._generation:
+                    self._dispatch[key] = handlers
+        return [handler(*args, **kwargs) for handler in handlers]
+
+    def _invalidate(self):
+        # called after handlers are changed, so a list resolved before that isn't stored
+        with self._dispatch_lock:
+            self._generation += 1
+            self._dispatch.clear()
+
+    def _post(self, delivery):
+        from lib.jobs import call_after, scheduler
+        if delivery == self.DL_MAIN_LOOP:
+            return call_after
+        elif delivery == self.DL_WORKER:
+            return scheduler.submit
+        raise ValueError('Unknown delivery: %s' % delivery)
+
+    def on(self, event_or_events, handler_or_handlers, weak=False, delivery=DL_DEFAULT, queue_size=1024):
+        """
+        Binds handlers to events, returns Subscription.
+        If ``weak`` is True bound methods are referenced weakly and unbound when their objects are collected.
+        ``delivery`` is one of DL_* modes, queued modes keep up to ``queue_size`` calls
+        and return None to the triggering side.
+        """
         events = self._prepare_events(event_or_events)
         handlers = self._prepare_handlers(handler_or_handlers)
+        if weak:
+            handlers = [WeakHandler(h, self) if getattr(h, 'im_self', None) is not None else h for h in handlers]
+        if delivery != self.DL_CALLER:
+            post = self._post(delivery)
+            handlers = [QueuedHandler(h, post, max_size=queue_size) for h in handlers]
         for event in events:
             hs = self.setdefault(event, [])
             hs.extend(filter(lambda h: h not in hs, handlers))
+        self._invalidate()
+        return Subscription(self, event_or_events, handlers)
 
     def off(self, events=None, handlers=None):
         if events is None and handlers is None:
@@ -184,6 +381,7 @@ class Events(dict):
             target_events = self.keys() if events is None else filter(lambda e: e in self, self._prepare_events(events))
             for hs in map(self.get, target_events):
                 map(hs.remove, filter(lambda h: h in hs, handlers)) #unbind handlers
+        self._invalidate()
 
 
 # Registers common app events
@@ -219,4 +417,38 @@ def test():
     print '~:b', e.trigger('~:b')
     print '~:a:~', e.trigger('~:a:~')
 
-    return e
\ No newline at end of file
+    return e
+
+
+def benchmark(handlers=20, repeat=20000):
+    """
+    Compares triggering with the compiled dispatch table, with resolving handlers
+    on every call and with the original trigger loop (a list lookup per handler)
+    """
+    e = Events()
+    for i in xrange(handlers):
+        e.on('config:draw_%d:changed' % i, lambda key, value: value)
+    e.on('config:*:changed', lambda key, value: key)
+    e.on('config', lambda key, value: None)
+
+    def baseline_trigger(events, *args, **kwargs):
+        get_handlers_func = partial(e._get_handlers, call_order=e.CO_DEFAULT, events_scope=e.ES_PROPAGATE_DEFAULT)
+        executed = []
+        results = []
+        for handler in chain(*map(get_handlers_func, e._prepare_events(events))):
+            if handler not in executed:
+                results.append(handler(*args, **kwargs))
+                executed.append(handler)
+        return results
+
+    def resolved_trigger(events, *args, **kwargs):
+        e._dispatch.clear()
+        return e.trigger(events, *args, **kwargs)
+
+    for name, trigger_func in (('baseline loop', baseline_trigger), ('resolved every time', resolved_trigger),
+                               ('dispatch table', e.trigger)):
+        start = time.time()
+        for i in xrange(repeat):
+            trigger_func('config:draw_position:changed', key='draw_position', value=i)
+        elapsed = time.time() - start
+        print '%-20s %8.0f triggers/s' % (name, repeat / elapsed)
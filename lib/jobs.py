@@ -0,0 +1,148 @@
+# coding=utf-8
+"""
+Background jobs.
+
+Jobs run in worker threads, their results are delivered to the main loop
+by the dispatcher registered with ``set_dispatcher`` (``wx.CallAfter`` in the GUI).
+Jobs submitted to the same group replace each other: a new job cancels the
+previous one, so results of outdated computations are never delivered.
+
+Example:
+    >>> scheduler.submit(data_factory, path, callback=self.on_data_loaded, group='data')
+"""
+__all__ = ['JobCancelled', 'Job', 'Scheduler', 'scheduler', 'set_dispatcher', 'call_after', 'check_cancelled']
+
+import threading
+from multiprocessing.pool import ThreadPool
+from multiprocessing.util import register_after_fork
+
+from constants import events
+from lib.config import app_config
+from lib.event import trigger
+from lib.i18n import gettext as _
+from lib.log import get_logger
+
+
+logger = get_logger('dsp.jobs')
+
+DEFAULT_JOBS_CONFIG = {
+    'jobs_workers': 2,
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_JOBS_CONFIG)
+
+_dispatcher = None
+_local = threading.local()
+
+
+def set_dispatcher(dispatcher):
+    """``dispatcher(func, *args)`` must call ``func(*args)`` in the main loop"""
+    global _dispatcher
+    _dispatcher = dispatcher
+
+def call_after(func, *args, **kwargs):
+    """Calls ``func`` in the main loop. Called from the main thread it runs immediately"""
+    if _dispatcher is None or threading.current_thread().name == 'MainThread':
+        return func(*args, **kwargs)
+    _dispatcher(func, *args, **kwargs)
+
+def current_job():
+    return getattr(_local, 'job', None)
+
+def check_cancelled():
+    """Raises JobCancelled if the job running in the current thread is cancelled"""
+    job = current_job()
+    if job is not None and job.cancelled:
+        raise JobCancelled()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(object):
+    def __init__(self, func, args=(), kwargs=None, callback=None, errback=None, group=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.callback = callback
+        self.errback = errback
+        self.group = group
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class Scheduler(object):
+    def __init__(self):
+        self._reset()
+        register_after_fork(self, Scheduler._reset)
+
+    def _reset(self):
+        self._pool = None
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(app_config.jobs_workers)
+            return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs ``func(*args, **kwargs)`` in background.
+        Options: ``callback(result)`` and ``errback(exception)`` are called in the main loop,
+        ``group`` - name of the group of jobs replacing each other.
+        """
+        callback = kwargs.pop('callback', None)
+        errback = kwargs.pop('errback', None)
+        group = kwargs.pop('group', None)
+        job = Job(func, args, kwargs, callback=callback, errback=errback, group=group)
+        if job.group is not None:
+            with self._lock:
+                previous = self._groups.get(job.group)
+                self._groups[job.group] = job
+            if previous is not None:
+                previous.cancel()
+        self._get_pool().apply_async(self._run, (job,))
+        return job
+
+    def cancel(self, group):
+        with self._lock:
+            job = self._groups.pop(group, None)
+        if job is not None:
+            job.cancel()
+
+    def _run(self, job):
+        if job.cancelled:
+            return
+        _local.job = job
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except JobCancelled:
+            return
+        except Exception as e:
+            logger.exception(_('Background job failed: %s') % e)
+            if job.errback is not None:
+                call_after(self._deliver, job, job.errback, e)
+        else:
+            if job.callback is not None:
+                call_after(self._deliver, job, job.callback, result)
+        finally:
+            _local.job = None
+
+    def _deliver(self, job, func, value):
+        # the job could be cancelled while its result was on the way
+        if not job.cancelled:
+            func(value)
+        with self._lock:
+            if self._groups.get(job.group) is job:
+                del self._groups[job.group]
+
+
+scheduler = Scheduler()
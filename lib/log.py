@@ -5,22 +5,59 @@ Logging system
 
 import logging
 import sys
+import threading
+from collections import deque
 
-from lib.event import app_events
+from constants import events
+from lib.config import app_config
+from lib.event import app_events, trigger
 
 
 LOGGER_EVENT = 'logging:log'
 
+DEFAULT_LOG_CONFIG = {
+    'log_buffer_size': 2000,        # records kept by the listener
+    'log_level': logging.INFO,      # records shown by the Log panel
+    'log_refresh_interval': 250,    # ms between updates of the Log panel
+    'log_max_lines': 1000,          # records kept by the Log panel
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_LOG_CONFIG)
+
 
 class LogListener(logging.Handler):
+    """
+    Keeps the last ``size`` records in a ring buffer, so readers may fetch
+    them in batches at their own rate instead of handling every record.
+    Each record is a tuple ``(number, level, message)``.
+    """
+    def __init__(self, size=DEFAULT_LOG_CONFIG['log_buffer_size'], level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.records = deque(maxlen=size)
+        self.count = 0
+        self._lock = threading.Lock()
+
     def emit(self, record):
         msg = self.format(record)
+        with self._lock:
+            self.count += 1
+            self.records.append((self.count, record.levelno, msg))
         app_events.trigger(LOGGER_EVENT, msg)
 
+    def since(self, number):
+        """Returns buffered records emitted after the record ``number``"""
+        with self._lock:
+            return [r for r in self.records if r[0] > number]
+
+
+_listener = None
 
 def get_logger(name=None):
     return logging.getLogger(name)
 
+def get_listener():
+    """Returns LogListener of the application or None if logging isn't set up"""
+    return _listener
+
 def setup(level=logging.DEBUG, FORMAT=u'%(asctime)-15s - %(levelname)s:%(name)-10s: %(message)s'):
     logging.basicConfig(format=FORMAT, level=level)
     logger = get_logger()
@@ -29,12 +66,13 @@ def setup(level=logging.DEBUG, FORMAT=u'%(asctime)-15s - %(levelname)s:%(name)-1
     handler.setLevel(logging.WARNING)
     logger.addHandler(handler)
 
-    listener = LogListener()
-    listener.setLevel(level)
-    logger.addHandler(listener)
+    global _listener
+    _listener = LogListener(app_config.log_buffer_size)
+    _listener.setLevel(level)
+    logger.addHandler(_listener)
 
-def subscribe(func):
-    app_events.on(LOGGER_EVENT, func)
+def subscribe(func, **kwargs):
+    return app_events.on(LOGGER_EVENT, func, **kwargs)
 
 def unsubscribe(func):
-    app_events.off(LOGGER_EVENT, func)
\ No newline at end of file
+    app_events.off(LOGGER_EVENT, [func])
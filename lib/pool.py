@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Shared worker pools.
+Pools are created on first use and live until the application exits.
+Processes forked by the process pool get their own pools.
+"""
+__all__ = ['cpu_count', 'thread_pool', 'process_pool']
+
+import multiprocessing
+import threading
+from multiprocessing.pool import ThreadPool
+from multiprocessing.util import register_after_fork
+
+from constants import events
+from lib.config import app_config
+from lib.event import trigger
+
+
+DEFAULT_POOL_CONFIG = {
+    'pool_threads': None,   # None - by number of cores
+    'pool_processes': None,
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_POOL_CONFIG)
+
+class _Pools(dict):
+    def __init__(self):
+        super(_Pools, self).__init__()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        # a forked process inherits neither threads of the pools nor the lock state
+        self.clear()
+        self.lock = threading.Lock()
+
+_pools = _Pools()
+register_after_fork(_pools, _Pools.reset)
+
+
+def cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+def _get_pool(name, factory, size):
+    with _pools.lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = factory(size or cpu_count())
+        return pool
+
+def thread_pool():
+    """Pool for I/O bound jobs and numpy code which releases the GIL"""
+    return _get_pool('threads', ThreadPool, app_config.pool_threads)
+
+def process_pool():
+    """Pool for CPU bound jobs. Functions and arguments must be picklable"""
+    return _get_pool('processes', multiprocessing.Pool, app_config.pool_processes)
@@ -0,0 +1,50 @@
+# coding=utf-8
+"""
+Progress of long operations.
+
+Progress is kept in ``main_progress_*`` config parameters, so any sink (the
+progress window of the GUI, for instance) follows it by config events.
+Functions may be called from background jobs, the config is changed in the main loop.
+"""
+__all__ = ['progress_max', 'progress_new', 'progress_tick', 'progress_release']
+
+from constants import events
+from lib.config import app_config
+from lib.event import trigger
+from lib.jobs import call_after
+
+
+DEFAULT_PROGRESS_CONFIG = {
+    'main_progress_max': 100,
+    'main_progress_position': 0,
+    'main_progress_visible': False,
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_PROGRESS_CONFIG)
+app_config.debounce('main_progress_position', 0.05) # a sink is updated not more than 20 times per second
+
+
+def progress_max(max_position=None):
+    if max_position is not None:
+        app_config.main_progress_max = max_position
+    return app_config.main_progress_max
+
+def progress_tick(add=1):
+    call_after(_progress_tick, add)
+
+def _progress_tick(add=1):
+    app_config.main_progress_position += add
+
+def progress_new(max_position=None):
+    call_after(_progress_new, max_position)
+
+def _progress_new(max_position=None):
+    with app_config.batch():
+        progress_max(max_position)
+        app_config.main_progress_position = 0
+        app_config.main_progress_visible = True
+
+def progress_release():
+    call_after(_progress_release)
+
+def _progress_release():
+    app_config.main_progress_visible = False
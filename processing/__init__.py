@@ -0,0 +1,4 @@
+# coding=utf-8
+"""
+Signal processing routines. They work with numpy arrays and don't depend on UI.
+"""
@@ -0,0 +1,104 @@
+# coding=utf-8
+"""
+Harmonic amplitudes and band levels over blocks of a recording
+"""
+__all__ = ['Harmonics', 'block_size_for', 'window_response', 'harmonics']
+
+from collections import namedtuple
+
+import numpy as np
+
+from data import SignalStream
+from lib.jobs import check_cancelled
+from processing.spectrum import get_window, next_fast_length, signal_frequency
+
+
+Harmonics = namedtuple('Harmonics', 'times frequencies amplitudes bands band_rms')
+
+
+def block_size_for(fq, frequencies, min_size=256):
+    """Block size with frequency bins not wider than a half of the smallest gap between ``frequencies``"""
+    gaps = np.diff(np.unique(np.asarray(frequencies, dtype=np.float64)))
+    gaps = gaps[gaps > 0]
+    size = int(np.ceil(2 * fq / gaps.min())) if len(gaps) else min_size
+    return next_fast_length(max(size, min_size))
+
+def window_response(weights, resolution=32):
+    """
+    Returns ``(offsets, gains)``: amplitude response of the window to a sine
+    ``offsets`` bins away from a bin centre, 0..1 bin, normalized to 1 at 0.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    response = np.abs(np.fft.rfft(weights, len(weights) * resolution)[:resolution + 1])
+    return np.arange(resolution + 1) / float(resolution), response / response[0]
+
+def _correct_scalloping(spectra, peaks, offsets, gains):
+    """
+    Amplitudes of sines between bins: the offset of a sine from the ``peaks`` bin
+    is found by the ratio of the peak and its larger neighbour, then the peak is
+    divided by the window gain at that offset.
+    """
+    half = offsets <= 0.5
+    ratios = gains[::-1][half] / gains[half]  # neighbour / peak for offsets 0..0.5
+    rows = np.arange(len(spectra))[:, np.newaxis]
+    last = spectra.shape[1] - 1
+    peak = spectra[rows, peaks]
+    left, right = spectra[rows, np.maximum(peaks - 1, 0)], spectra[rows, np.minimum(peaks + 1, last)]
+    ratio = np.maximum(left, right) / np.maximum(peak, 1e-30)
+    offset = np.interp(ratio, ratios, offsets[half])
+    offset[(peaks == 0) | (peaks == last)] = 0
+    return peak / np.interp(offset, offsets, gains)
+
+def harmonics(file_name, frequencies, bands=(), block_size=None, window='hanning', batch_size=64):
+    """
+    Splits the TMB1 file into blocks of ``block_size`` samples (see ``block_size_for``)
+    and returns Harmonics of every block:
+        ``amplitudes`` - blocks x frequencies, peak amplitude at each of ``frequencies``
+            (NaN above the Nyquist frequency), corrected for a sine between bins,
+        ``band_rms`` - blocks x bands, RMS of the signal in each ``[low, high)`` band of ``bands``,
+        ``times`` - start of each block, seconds.
+    Blocks are transformed in batches by one ``rfft`` call, the file is read once.
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    bands = list(bands)
+    with SignalStream(file_name) as stream:
+        fq = signal_frequency(stream)
+        size = block_size or block_size_for(fq, frequencies)
+        weights = get_window(window, size)
+        half = size // 2
+
+        # the nearest bin and its neighbours, so a peak between bins isn't lost
+        nearest = np.round(frequencies * size / fq).astype(np.intp)
+        neighbours = np.clip(nearest[:, np.newaxis] + np.arange(-1, 2), 0, half)
+        offsets, gains = window_response(weights)
+        bins = np.arange(half + 1) * fq / size
+        masks = np.array([(bins >= low) & (bins < high) for low, high in bands], dtype=np.float64)
+        masks = masks.reshape(len(bands), half + 1)
+
+        # a sine of amplitude A on a bin has peak A, band power is one-sided (Parseval)
+        amplitude_gain = 2.0 / weights.sum()
+        power_gain = 2.0 / (size * (weights.astype(np.float64) ** 2).sum())
+
+        amplitudes, band_rms = [], []
+        def transform(batch):
+            check_cancelled()
+            spectra = np.abs(np.fft.rfft(batch * weights, axis=-1))
+            peaks = neighbours[np.arange(len(nearest)), spectra[:, neighbours].argmax(axis=-1)]
+            amplitudes.append(_correct_scalloping(spectra, peaks, offsets, gains) * amplitude_gain)
+            band_rms.append(np.sqrt(np.dot(spectra ** 2, masks.T) * power_gain))
+
+        batch = np.empty((batch_size, size), dtype=np.float32)
+        filled = 0
+        for samples in stream.windows(size, size):
+            batch[filled] = samples
+            filled += 1
+            if filled == batch_size:
+                transform(batch)
+                filled = 0
+        if filled:
+            transform(batch[:filled])
+
+    amplitudes = np.concatenate(amplitudes) if amplitudes else np.zeros((0, len(frequencies)))
+    amplitudes[:, nearest > half] = np.nan
+    band_rms = np.concatenate(band_rms) if band_rms else np.zeros((0, len(bands)))
+    return Harmonics(np.arange(len(amplitudes)) * size / fq, frequencies, amplitudes, bands, band_rms)
@@ -0,0 +1,77 @@
+# coding=utf-8
+"""
+Multi-resolution min/max envelope of a signal
+"""
+__all__ = ['MinMaxPyramid']
+
+import numpy as np
+
+
+class MinMaxPyramid(object):
+    """
+    Precomputed min/max decimation pyramid.
+
+    Level 0 keeps minimum and maximum of every ``BASE_BUCKET`` samples, every next level
+    reduces the previous one by ``FACTOR``, so the pyramid takes a few percent of the signal.
+    Envelope of any window is taken from the coarsest level which still has enough buckets,
+    so a peak is never lost; short windows are drawn by the samples themselves.
+
+    Example:
+        >>> pyramid = MinMaxPyramid(samples)
+        >>> x, y = pyramid.envelope(0, len(samples), points=800)
+    """
+    BASE_BUCKET = 64
+    FACTOR = 4
+    MIN_LEVEL_SIZE = 256
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.levels = []    # [(bucket size, mins, maxs)]
+
+        samples = np.asarray(samples)
+        if len(samples) <= self.BASE_BUCKET * self.MIN_LEVEL_SIZE // self.FACTOR:
+            return
+        mins, maxs = self._reduce(samples, samples, self.BASE_BUCKET)
+        bucket = self.BASE_BUCKET
+        self.levels.append((bucket, mins, maxs))
+        while len(mins) > self.MIN_LEVEL_SIZE:
+            mins, maxs = self._reduce(mins, maxs, self.FACTOR)
+            bucket *= self.FACTOR
+            self.levels.append((bucket, mins, maxs))
+
+    @staticmethod
+    def _reduce(mins, maxs, factor):
+        size = len(mins) // factor * factor
+        reduced_mins = mins[:size].reshape(-1, factor).min(axis=1)
+        reduced_maxs = maxs[:size].reshape(-1, factor).max(axis=1)
+        if size < len(mins):
+            reduced_mins = np.append(reduced_mins, mins[size:].min())
+            reduced_maxs = np.append(reduced_maxs, maxs[size:].max())
+        return reduced_mins, reduced_maxs
+
+    def envelope(self, first, last, points):
+        """
+        Returns ``(x, y)`` to draw samples ``[first, last)`` with about ``2 * points`` points
+        (or the samples themselves if the window is shorter than ``points`` base buckets).
+        ``x`` is expressed in sample positions.
+        """
+        first, last = max(int(first), 0), min(int(last), len(self.samples))
+        if last <= first:
+            return np.empty(0), np.empty(0)
+
+        level = None
+        for bucket, mins, maxs in self.levels:
+            if (last - first) / bucket < points:
+                break
+            level = bucket, mins, maxs
+
+        if level is None:
+            return np.arange(first, last), np.asarray(self.samples[first:last])
+
+        bucket, mins, maxs = level
+        first_bucket, last_bucket = first // bucket, -(-last // bucket)
+        x = np.repeat(np.arange(first_bucket, last_bucket) * bucket + bucket / 2.0, 2)
+        y = np.empty(len(x), dtype=mins.dtype)
+        y[0::2] = mins[first_bucket:last_bucket]
+        y[1::2] = maxs[first_bucket:last_bucket]
+        return x, y
@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+Whole-file spectrogram stored as multi-resolution tiles
+"""
+__all__ = ['SpectrogramTiles', 'get_spectrogram']
+
+import numpy as np
+
+from data import SignalStream
+from lib.cache import LRUCache, file_key
+from lib.jobs import check_cancelled
+from processing.spectrum import get_window, signal_frequency
+
+
+class SpectrogramTiles(object):
+    """
+    Short-time Fourier transform power of the whole TMB1 file.
+
+    Level 0 keeps one column per STFT segment, each next level averages pairs of
+    columns of the previous one. Every level is split into tiles of ``TILE_WIDTH``
+    columns, so an image of any window is glued from a few tiles of the level
+    with resolution close to the screen one.
+
+    Example:
+        >>> tiles = SpectrogramTiles(file_name)
+        >>> image, extent = tiles.image(0, 30000, columns=800)
+    """
+    TILE_WIDTH = 256
+
+    def __init__(self, file_name, nfft=256, overlap=0.5, window='hanning', batch_size=512):
+        self.file_name = file_name
+        self.nfft = nfft
+        self.step = max(int(nfft * (1 - overlap)), 1)
+
+        with SignalStream(file_name) as stream:
+            self.frequency = signal_frequency(stream)
+            weights = get_window(window, nfft)
+            columns = []
+            batch = np.empty((batch_size, nfft), dtype=np.float32)
+            filled = 0
+            for samples in stream.windows(nfft, self.step):
+                batch[filled] = samples
+                filled += 1
+                if filled == batch_size:
+                    check_cancelled()
+                    columns.append(self._power(batch, weights))
+                    filled = 0
+            if filled:
+                columns.append(self._power(batch[:filled], weights))
+
+        power = np.concatenate(columns) if columns else np.zeros((0, nfft // 2 + 1), dtype=np.float32)
+        self.levels = [self._split(power)]
+        while len(power) > self.TILE_WIDTH:
+            power = self._halve(power)
+            self.levels.append(self._split(power))
+
+    def _power(self, batch, weights):
+        return (np.abs(np.fft.rfft(batch * weights, axis=-1)) ** 2).astype(np.float32)
+
+    def _halve(self, power):
+        size = len(power) // 2 * 2
+        halved = (power[0:size:2] + power[1:size:2]) / 2
+        if size < len(power):
+            halved = np.concatenate((halved, power[size:]))
+        return halved
+
+    def _split(self, power):
+        return [power[i:i + self.TILE_WIDTH] for i in xrange(0, len(power), self.TILE_WIDTH)]
+
+    def image(self, first, last, columns):
+        """
+        Returns ``(image, extent)`` of samples ``[first, last)`` with not more than
+        ``columns`` time columns (unless level 0 is still too coarse).
+        ``image`` is frequency x time power in dB, ``extent`` is (t0, t1, f0, f1) in seconds and Hz.
+        """
+        for level, tiles in enumerate(self.levels):
+            width = self.step * 2 ** level
+            if float(last - first) / width <= columns:
+                break
+
+        size = sum(len(tile) for tile in tiles)
+        # a page inside the last partial segment still gets the last column
+        first_column = min(max(int(first) // width, 0), max(size - 1, 0))
+        last_column = min(max(-(-int(last) // width), first_column + 1), size)
+        first_tile, last_tile = first_column // self.TILE_WIDTH, -(-last_column // self.TILE_WIDTH)
+        power = np.concatenate(tiles[first_tile:last_tile] or [np.zeros((0, self.nfft // 2 + 1))])
+        offset = first_tile * self.TILE_WIDTH
+        power = power[first_column - offset:last_column - offset]
+
+        image = 10 * np.log10(power.T + 1e-20)
+        extent = (first_column * width / self.frequency, last_column * width / self.frequency,
+                  0, self.frequency / 2)
+        return image, extent
+
+
+_spectrograms = LRUCache(max_size=16)
+def get_spectrogram(file_name, nfft=256, overlap=0.5, window='hanning'):
+    """Returns SpectrogramTiles of the file, computed once for the set of parameters"""
+    return _spectrograms.get_or_compute((file_key(file_name), nfft, overlap, window),
+        SpectrogramTiles, file_name, nfft=nfft, overlap=overlap, window=window)
@@ -0,0 +1,158 @@
+# coding=utf-8
+"""
+Amplitude spectrum of signal frames
+"""
+__all__ = ['WINDOWS', 'next_fast_length', 'get_window', 'signal_frequency', 'welch_psd',
+           'SpectrumEngine', 'spectrum_engine']
+
+import numpy as np
+
+from data import SignalStream
+from lib.cache import LRUCache, file_key
+from lib.pool import process_pool
+
+
+WINDOWS = {
+    'boxcar': np.ones,
+    'hanning': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman,
+    'bartlett': np.bartlett,
+}
+
+
+def next_fast_length(size):
+    """Returns the smallest 2**a * 3**b * 5**c which is not less than ``size``"""
+    if size <= 6:
+        return max(int(size), 1)
+    best = 1 << int(np.ceil(np.log2(size)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            # the smallest power of 2 to reach the size
+            quotient = -(-size // p35)
+            p2 = 1 << int(np.ceil(np.log2(quotient))) if quotient > 1 else 1
+            best = min(best, p2 * p35)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+_windows = {}
+def get_window(name, size):
+    key = name, size
+    window = _windows.get(key)
+    if window is None:
+        if name not in WINDOWS:
+            raise ValueError('Unknown window function: %s' % name)
+        window = _windows[key] = WINDOWS[name](size).astype(np.float32)
+    return window
+
+def signal_frequency(signal):
+    """Sampling frequency of ``signal`` (SignalData), Hz"""
+    return float(signal.header.data_size) / signal.header.total_rcv_time
+
+
+def welch_psd(file_name, size=None, overlap=0.5, window='hanning', batch_size=64):
+    """
+    Averaged (Welch) one-sided power spectral density of the whole TMB1 file, V**2/Hz.
+
+    The file is streamed by windows of ``size`` samples (``fetch_size_per_channel``
+    by default) overlapped by ``overlap`` part of the window. Windows are transformed
+    in batches of ``batch_size``, so memory usage doesn't depend on the file size.
+    Returns ``(frequencies, psd, windows_count)``.
+    """
+    with SignalStream(file_name) as stream:
+        size = size or stream.header.fetch_size_per_channel
+        step = max(int(size * (1 - overlap)), 1)
+        fq = signal_frequency(stream)
+        weights = get_window(window, size)
+
+        total = np.zeros(size // 2 + 1)
+        batch = np.empty((batch_size, size), dtype=np.float32)
+        count = filled = 0
+        for samples in stream.windows(size, step):
+            batch[filled] = samples
+            filled += 1
+            if filled == batch_size:
+                total += (np.abs(np.fft.rfft(batch * weights, axis=-1)) ** 2).sum(axis=0)
+                count, filled = count + filled, 0
+        if filled:
+            total += (np.abs(np.fft.rfft(batch[:filled] * weights, axis=-1)) ** 2).sum(axis=0)
+            count += filled
+
+    psd = total / (max(count, 1) * fq * (weights.astype(np.float64) ** 2).sum())
+    psd[1:-1 if size % 2 == 0 else None] *= 2  # one-sided: fold negative frequencies
+    return np.arange(len(psd)) * fq / size, psd, count
+
+def _welch_psd_job(args):
+    file_name, kwargs = args
+    return welch_psd(file_name, **kwargs)
+
+
+class SpectrumEngine(object):
+    """
+    Computes amplitude spectra of signal frames and keeps recent results in LRU cache.
+    Results are keyed by (file, frame, window function, nfft), so scrolling back
+    to an already seen frame doesn't recompute anything.
+    """
+    def __init__(self, max_size=256):
+        self._cache = LRUCache(max_size)
+
+    def _key(self, signal, frame, window, nfft):
+        offset = getattr(signal, 'offset', 0)
+        return file_key(signal.file_name), frame[0] + offset, frame[1] + offset, window, nfft
+
+    def spectra(self, signals, frame, window='boxcar', nfft=None):
+        """
+        Returns list of ``(frequencies, amplitudes)`` of ``signals`` (SignalsDataSet)
+        samples ``[frame[0], frame[1])``. ``nfft`` is the FFT size, by default the frame
+        is zero padded to the next fast length. Only frames of missed channels are copied,
+        they are transformed by one batched ``rfft`` call.
+        """
+        first, last = int(frame[0]), int(frame[1])
+        results = [self._cache.get(self._key(signal, (first, last), window, nfft)) for signal in signals]
+        missed = [i for i, result in enumerate(results) if result is None]
+        if not missed:
+            return results
+
+        frames = [signals[i].float_data[first:last] for i in missed]
+        size = nfft or next_fast_length(max(len(samples) for samples in frames))
+        batch = np.zeros((len(frames), size), dtype=np.float32)
+        gains = np.ones(len(frames))
+        for row, samples in enumerate(frames):
+            samples = samples[:size]
+            if len(samples):
+                weights = get_window(window, len(samples))
+                batch[row, :len(samples)] = samples * weights
+                gains[row] = weights.sum()
+
+        amplitudes = np.abs(np.fft.rfft(batch, axis=-1)) / gains[:, np.newaxis]
+        for i, amplitude in zip(missed, amplitudes):
+            signal = signals[i]
+            frequencies = np.arange(len(amplitude)) * signal_frequency(signal) / size
+            results[i] = frequencies, amplitude
+            self._cache.put(self._key(signal, (first, last), window, nfft), results[i])
+        return results
+
+    def psd(self, signals, size=None, overlap=0.5, window='hanning'):
+        """
+        Returns list of ``(frequencies, psd)`` averaged over whole files of ``signals``.
+        Files are processed in parallel by the process pool, results are cached.
+        """
+        keys = [(file_key(signal.file_name), 'psd', size, overlap, window) for signal in signals]
+        results = [self._cache.get(key) for key in keys]
+        missed = [i for i, result in enumerate(results) if result is None]
+        if missed:
+            kwargs = dict(size=size, overlap=overlap, window=window)
+            jobs = [(signals[i].file_name, kwargs) for i in missed]
+            for i, (frequencies, psd, count) in zip(missed, process_pool().map(_welch_psd_job, jobs)):
+                results[i] = frequencies, psd
+                self._cache.put(keys[i], results[i])
+        return results
+
+    def clear(self):
+        self._cache.clear()
+
+
+spectrum_engine = SpectrumEngine()
@@ -0,0 +1,162 @@
+# coding=utf-8
+"""
+Statistics of signal windows
+"""
+__all__ = ['Stats', 'signal_stats', 'RunningStats']
+
+from collections import namedtuple
+
+import numpy as np
+
+from lib.jobs import check_cancelled
+
+
+Stats = namedtuple('Stats', 'count min max mean power rms peak_to_peak crest skewness kurtosis')
+
+
+def _stats(count, center, moments, lowest, highest):
+    """Makes Stats from raw moments of samples deviations from ``center``"""
+    m1, m2, m3, m4 = moments
+    variance = m2 - m1 ** 2
+    if variance <= 1e-12 * m2:
+        variance = 0.0  # constant samples, the difference is a rounding error
+    mu3 = m3 - 3 * m1 * m2 + 2 * m1 ** 3
+    mu4 = m4 - 4 * m1 * m3 + 6 * m1 ** 2 * m2 - 3 * m1 ** 4
+
+    lowest, highest = float(lowest), float(highest)
+    mean = center + m1
+    power = variance + mean ** 2
+    rms = np.sqrt(power)
+    return Stats(
+        count=count,
+        min=lowest,
+        max=highest,
+        mean=mean,
+        power=power,
+        rms=rms,
+        peak_to_peak=highest - lowest,
+        crest=max(abs(lowest), abs(highest)) / rms if rms else 0.0,
+        skewness=mu3 / variance ** 1.5 if variance else 0.0,
+        kurtosis=mu4 / variance ** 2 if variance else 0.0,
+    )
+
+def signal_stats(samples):
+    """Returns Stats of all ``samples`` or None if there are no samples"""
+    samples = np.asarray(samples)
+    if not len(samples):
+        return None
+    center = float(samples.mean(dtype=np.float64))
+    deviation = samples.astype(np.float64) - center
+    moments, power = [], np.ones(len(samples))
+    for k in xrange(4):
+        power *= deviation
+        moments.append(power.mean())
+    return _stats(len(samples), center, moments, samples.min(), samples.max())
+
+
+def _moments(samples):
+    """Returns ``(count, mean, M2, M3, M4, min, max)`` of ``samples``, M are sums of central powers"""
+    samples = np.asarray(samples, dtype=np.float64)
+    mean = samples.mean()
+    deviation = samples - mean
+    square = deviation ** 2
+    return (float(len(samples)), mean, square.sum(), (square * deviation).sum(), (square ** 2).sum(),
+            samples.min(), samples.max())
+
+def _merge(a, b):
+    """
+    Moments of the union of two sets of samples (Chan, Pebay). Works element-wise on arrays.
+    Central moments are merged directly, so there is no cancellation of large raw sums.
+    """
+    na, mean_a, m2a, m3a, m4a, min_a, max_a = a
+    nb, mean_b, m2b, m3b, m4b, min_b, max_b = b
+    n = na + nb
+    delta = mean_b - mean_a
+    m2 = m2a + m2b + delta ** 2 * na * nb / n
+    m3 = (m3a + m3b + delta ** 3 * na * nb * (na - nb) / n ** 2 +
+          3 * delta * (na * m2b - nb * m2a) / n)
+    m4 = (m4a + m4b + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / n ** 3 +
+          6 * delta ** 2 * (na * na * m2b + nb * nb * m2a) / n ** 2 +
+          4 * delta * (na * m3b - nb * m3a) / n)
+    return n, mean_a + delta * nb / n, m2, m3, m4, np.minimum(min_a, min_b), np.maximum(max_a, max_b)
+
+
+class RunningStats(object):
+    """
+    Statistics of any window of a signal without passes over its samples.
+
+    Samples are split into blocks of ``BLOCK_SIZE``, central moments and extremes
+    of blocks are merged pairwise into a tree. A window is covered by a few whole
+    nodes of every level (O(log n)) plus partial blocks at its edges, which are
+    computed from samples. Central moments are merged, not raw power sums, so
+    a transient or a DC drift doesn't spoil precision of other windows.
+    The tree takes ~1/30 of the samples size, it's built by one pass over samples
+    in chunks, so it's fine for mapped files and may be run in a background job.
+
+    Example:
+        >>> stats = RunningStats(signal.float_data)
+        >>> stats.window(1000, 4000).rms
+    """
+    BLOCK_SIZE = 1024
+    CHUNK_BLOCKS = 256
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.size = len(samples)
+
+        blocks = [tuple(np.zeros(0) for _field in xrange(7))]
+        chunk_size = self.BLOCK_SIZE * self.CHUNK_BLOCKS
+        for first in xrange(0, self.size - self.size % self.BLOCK_SIZE, chunk_size):
+            check_cancelled()
+            chunk = np.asarray(samples[first:first + chunk_size], dtype=np.float64)
+            chunk = chunk[:len(chunk) // self.BLOCK_SIZE * self.BLOCK_SIZE].reshape(-1, self.BLOCK_SIZE)
+            mean = chunk.mean(axis=1)
+            deviation = chunk - mean[:, np.newaxis]
+            square = deviation ** 2
+            blocks.append((np.ones(len(chunk)) * self.BLOCK_SIZE, mean, square.sum(axis=1),
+                           (square * deviation).sum(axis=1), (square ** 2).sum(axis=1),
+                           chunk.min(axis=1), chunk.max(axis=1)))
+
+        level = tuple(np.concatenate(fields) for fields in zip(*blocks))
+        self.levels = [level]
+        while len(level[0]) > 1:
+            size = len(level[0]) // 2 * 2
+            merged = _merge([field[0:size:2] for field in level], [field[1:size:2] for field in level])
+            if size < len(level[0]):
+                merged = [np.append(field, tail[-1]) for field, tail in zip(merged, level)]
+            level = tuple(merged)
+            self.levels.append(level)
+
+    def _cover(self, first, last):
+        """Yields moments of tree nodes covering blocks ``[first, last)``"""
+        for level in self.levels:
+            if first >= last:
+                return
+            upper_first, upper_last = -(-first // 2), last // 2
+            if upper_last <= upper_first:
+                for i in xrange(first, last):
+                    yield tuple(field[i] for field in level)
+                return
+            # nodes which don't fill nodes of the next level
+            for i in range(first, upper_first * 2) + range(upper_last * 2, last):
+                yield tuple(field[i] for field in level)
+            first, last = upper_first, upper_last
+
+    def window(self, first, last):
+        """Returns Stats of samples ``[first, last)`` or None if the window is empty"""
+        first, last = max(int(first), 0), min(int(last), self.size)
+        if last <= first:
+            return None
+
+        first_block, last_block = -(-first // self.BLOCK_SIZE), last // self.BLOCK_SIZE
+        if last_block <= first_block:
+            parts = [_moments(self.samples[first:last])]
+        else:
+            parts = list(self._cover(first_block, last_block))
+            for edge in ((first, first_block * self.BLOCK_SIZE), (last_block * self.BLOCK_SIZE, last)):
+                if edge[0] < edge[1]:
+                    parts.append(_moments(self.samples[edge[0]:edge[1]]))
+
+        moments = reduce(_merge, parts)
+        count, mean, m2, m3, m4, lowest, highest = moments
+        return _stats(int(count), mean, (0.0, m2 / count, m3 / count, m4 / count), lowest, highest)
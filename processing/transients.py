@@ -0,0 +1,130 @@
+# coding=utf-8
+"""
+Transient (impact) detection by the ratio of short-term and long-term average energy
+"""
+__all__ = ['Transients', 'detect_transients', 'get_transients']
+
+from collections import namedtuple
+
+import numpy as np
+
+from constants import events
+from lib.cache import get_cache
+from lib.config import app_config
+from lib.event import trigger
+from lib.jobs import check_cancelled
+from processing.spectrum import signal_frequency
+
+
+DEFAULT_TRANSIENTS_CONFIG = {
+    'transients_sta': 0.005,        # seconds
+    'transients_lta': 0.5,          # seconds
+    'transients_trigger_on': 4.0,
+    'transients_trigger_off': 1.5,
+}
+trigger(events.DO_UPDATE_CONFIG, DEFAULT_TRANSIENTS_CONFIG)
+
+
+Transients = namedtuple('Transients', 'offsets durations peaks')
+
+
+def detect_transients(channels, fq, sta=0.005, lta=0.5, trigger_on=4.0, trigger_off=1.5, chunk_size=65536):
+    """
+    Finds transients in all ``channels`` (arrays of samples, e.g. ``float_data``) at once by STA/LTA:
+    energy of the last ``sta`` seconds over energy of ``lta`` seconds before them.
+    A transient starts when the ratio of any channel exceeds ``trigger_on`` and
+    lasts while it's above ``trigger_off``. Returns Transients:
+        ``offsets``, ``durations`` - samples, ``peaks`` - the highest ratio.
+    Chunks of ``chunk_size`` samples of all channels are stacked and reduced together,
+    only running energy sums of the last ``sta + lta`` seconds are kept between chunks,
+    so memory doesn't depend on the length of recordings.
+    """
+    channels = [np.asarray(samples) for samples in channels]
+    length = max(len(samples) for samples in channels) if channels else 0
+    means = np.array([samples.mean(dtype=np.float64) if len(samples) else 0.0 for samples in channels])
+    sta_size = max(int(sta * fq), 1)
+    lta_size = max(int(lta * fq), 1)
+    history = sta_size + lta_size
+
+    # running sums of energy of samples [0, i) for the last ``history`` indices i
+    sums = np.zeros((len(channels), 1))
+    start = 0 # index of the first column of ``sums``
+    found, opened, peak = [], None, 0.0
+    for first in xrange(0, length, chunk_size):
+        check_cancelled()
+        last = min(first + chunk_size, length)
+        # tails of shorter channels are padded by their means, so they have no energy
+        chunk = np.empty((len(channels), last - first))
+        chunk[:] = means[:, np.newaxis]
+        for row, samples in zip(chunk, channels):
+            part = samples[first:last]
+            row[:len(part)] = part
+        energy = (chunk - means[:, np.newaxis]) ** 2
+        sums = np.hstack((sums, sums[:, -1:] + np.cumsum(energy, axis=1)))
+
+        # ratios at indices i in [begin, last], where the long-term window is complete
+        begin = max(first + 1, start + history)
+        columns = np.arange(begin, last + 1) - start
+        short_energy = sums[:, columns] - sums[:, columns - sta_size]
+        long_energy = sums[:, columns - sta_size] - sums[:, columns - history]
+        ratio = (short_energy * lta_size / np.maximum(long_energy * sta_size, 1e-20)).max(axis=0)
+
+        ons, offs = np.flatnonzero(ratio > trigger_on), np.flatnonzero(ratio < trigger_off)
+        position = 0
+        while position < len(ratio):
+            if opened is None:
+                index = ons.searchsorted(position)
+                if index == len(ons):
+                    break
+                position = ons[index]
+                opened, peak = max(begin + position - sta_size, 0), 0.0
+            else:
+                index = offs.searchsorted(position)
+                stop = offs[index] if index < len(offs) else len(ratio)
+                peak = max(peak, ratio[position:stop].max()) if stop > position else peak
+                if index == len(offs):
+                    break
+                found.append((opened, begin + stop - opened, peak))
+                opened, position = None, stop
+
+        sums = sums[:, -history:]
+        start = last + 1 - sums.shape[1]
+
+    if opened is not None:
+        found.append((opened, length - opened, peak))
+    offsets, durations, peaks = zip(*found) if found else ((), (), ())
+    return Transients(
+        offsets=np.array(offsets, dtype=np.intp),
+        durations=np.array(durations, dtype=np.intp),
+        peaks=np.array(peaks, dtype=np.float64),
+    )
+
+
+def get_transients(signals, sta=None, lta=None, trigger_on=None, trigger_off=None):
+    """
+    Returns Transients of the data set ``signals`` (SignalsDataSet), parameters are taken
+    from the config by default. The index is stored in the file cache (see ``lib.cache``)
+    next to decoded samples of the first channel, so it's built once per recording.
+    """
+    params = (sta or app_config.transients_sta, lta or app_config.transients_lta,
+              trigger_on or app_config.transients_trigger_on, trigger_off or app_config.transients_trigger_off)
+    names = [signal.file_name for signal in signals]
+    if not names:
+        return detect_transients([], 1.0)
+
+    cache = get_cache()
+    kind = u'transients:%r:%s' % (params, u'\0'.join(names))
+    cached = cache and cache.get(names[0], kind)
+    if cached:
+        meta, arrays = cached
+        if meta['identities'] == [cache.identity(name) for name in names[1:]]:
+            return Transients(*[np.array(arrays[field]) for field in Transients._fields])
+
+    sta, lta, trigger_on, trigger_off = params
+    transients = detect_transients([signal.float_data for signal in signals], signal_frequency(signals[0]),
+        sta=sta, lta=lta, trigger_on=trigger_on, trigger_off=trigger_off)
+    if cache:
+        cache.put(names[0], kind, transients._asdict(), {
+            'identities': [cache.identity(name) for name in names[1:]],
+        })
+    return transients
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+Features of sliding windows over the whole recording (run-down trends)
+"""
+__all__ = ['Trends', 'feature_trends', 'get_trends']
+
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from lib.cache import LRUCache, file_key
+from lib.jobs import check_cancelled
+from processing.spectrum import get_window, signal_frequency
+
+
+Trends = namedtuple('Trends', 'times rms peak crest dominant_frequency')
+
+
+def _dominant_frequency(rows, weights, fq):
+    """Frequency of the highest spectrum peak of every row (DC excluded), refined by a parabola"""
+    rows = rows - rows.mean(axis=1)[:, np.newaxis]
+    amplitudes = np.abs(np.fft.rfft(rows * weights, axis=-1))
+    amplitudes[:, 0] = 0
+    peaks = amplitudes.argmax(axis=1)
+
+    # vertex of the parabola through the peak bin and its neighbours
+    shift = np.zeros(len(rows))
+    inner = (peaks > 0) & (peaks < amplitudes.shape[1] - 1)
+    index, peak = np.nonzero(inner)[0], peaks[inner]
+    left, center, right = amplitudes[index, peak - 1], amplitudes[index, peak], amplitudes[index, peak + 1]
+    curvature = left - 2 * center + right
+    valid = curvature < 0
+    shift[index[valid]] = 0.5 * (left - right)[valid] / curvature[valid]
+    return (peaks + shift) * fq / rows.shape[1]
+
+def feature_trends(samples, fq, size=1024, step=None, window='hanning', chunk_size=256):
+    """
+    Slides a window of ``size`` samples with ``step`` (a half of the window by default)
+    over ``samples`` and returns Trends of every window position:
+        ``times`` - start of each window, seconds,
+        ``rms``, ``peak``, ``crest`` - level features of the window,
+        ``dominant_frequency`` - frequency of the highest spectrum peak, Hz.
+    Windows are a strided view of ``samples``, they are copied and transformed by
+    ``chunk_size`` rows at once, so time is linear and memory bounded by the chunk.
+    """
+    samples = np.asarray(samples)
+    size = min(int(size), len(samples))
+    step = max(int(step or size // 2), 1)
+    count = (len(samples) - size) // step + 1 if size else 0
+
+    windows = as_strided(samples, shape=(count, size), strides=(step * samples.strides[0], samples.strides[0]))
+    weights = get_window(window, size).astype(np.float64) if size else None
+    rms, peak, frequency = np.zeros(count), np.zeros(count), np.zeros(count)
+    for first in xrange(0, count, chunk_size):
+        check_cancelled()
+        last = min(first + chunk_size, count)
+        rows = windows[first:last].astype(np.float64)
+        rms[first:last] = np.sqrt((rows ** 2).mean(axis=1))
+        peak[first:last] = np.abs(rows).max(axis=1)
+        frequency[first:last] = _dominant_frequency(rows, weights, fq)
+
+    crest = np.where(rms > 0, peak / np.where(rms > 0, rms, 1), 0)
+    return Trends(
+        times=np.arange(count) * step / float(fq),
+        rms=rms,
+        peak=peak,
+        crest=crest,
+        dominant_frequency=frequency,
+    )
+
+
+_trends = LRUCache(max_size=16)
+def get_trends(signal, size=1024, step=None, window='hanning'):
+    """Returns Trends of ``signal`` (SignalData), computed once for the set of parameters"""
+    key = file_key(signal.file_name), getattr(signal, 'offset', 0), len(signal.float_data), size, step, window
+    return _trends.get_or_compute(key,
+        feature_trends, signal.float_data, signal_frequency(signal), size=size, step=step, window=window)
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+Multi-level discrete wavelet decomposition
+"""
+__all__ = ['WAVELETS', 'MODES', 'dwt_levels', 'WaveletEngine', 'wavelet_engine']
+
+import numpy as np
+
+from lib.cache import LRUCache, file_key
+from lib.pool import process_pool
+
+
+# wavelets and signal extension modes offered by the UI, see pywt.wavelist() and pywt.MODES
+WAVELETS = ('haar', 'db2', 'db4', 'db8', 'db20', 'sym8', 'coif5', 'bior3.5', 'dmey')
+MODES = ('zpd', 'cpd', 'sp1', 'sym', 'ppd', 'per')
+
+def dwt_levels(approximation, count, wavelet='db20', mode='sp1'):
+    """Decomposes ``approximation`` for ``count`` levels, returns [(cA, cD)]"""
+    import pywt
+    approximation = np.asarray(approximation, dtype=np.float64)
+    levels = []
+    for _level in xrange(count):
+        approximation, detail = pywt.dwt(approximation, wavelet, mode)
+        levels.append((approximation, detail))
+    return levels
+
+def _dwt_levels(args):
+    approximation, wavelet, mode, count = args
+    return dwt_levels(approximation, count, wavelet, mode)
+
+
+class WaveletEngine(object):
+    """
+    Keeps multi-level decompositions (``wavedec``) of signals.
+
+    Level ``k`` is computed from the approximation of level ``k - 1``, so all
+    levels already computed for the signal and the wavelet are reused when
+    a deeper level is requested. Decompositions of recently used signals
+    are kept in LRU cache.
+    """
+    def __init__(self, max_size=16):
+        self._cache = LRUCache(max_size) # (signal, wavelet, mode) -> [(cA1, cD1), (cA2, cD2), ...]
+
+    def _key(self, signal, wavelet, mode):
+        return file_key(signal.file_name), getattr(signal, 'offset', 0), len(signal.float_data), wavelet, mode
+
+    def max_level(self, signal, wavelet='db20'):
+        import pywt
+        return pywt.dwt_max_level(len(signal.float_data), pywt.Wavelet(wavelet).dec_len)
+
+    def decompose(self, signals, level, wavelet='db20', mode='sp1'):
+        """
+        Returns list of decompositions ``[(cA1, cD1), ..., (cA_level, cD_level)]`` of ``signals``.
+        Missed levels of different signals are computed in parallel by the process pool.
+        """
+        keys = [self._key(signal, wavelet, mode) for signal in signals]
+        known = [self._cache.get(key, []) for key in keys]
+
+        jobs, missed = [], []
+        for i, (signal, levels) in enumerate(zip(signals, known)):
+            if len(levels) < level:
+                approximation = levels[-1][0] if levels else np.asarray(signal.float_data, dtype=np.float64)
+                jobs.append((approximation, wavelet, mode, level - len(levels)))
+                missed.append(i)
+
+        for i, levels in zip(missed, process_pool().map(_dwt_levels, jobs) if jobs else []):
+            known[i] = known[i] + levels
+
+        for key, levels in zip(keys, known):
+            self._cache.put(key, levels)
+
+        return [levels[:level] for levels in known]
+
+    def clear(self):
+        self._cache.clear()
+
+
+wavelet_engine = WaveletEngine()
@@ -5,17 +5,16 @@ Main Application class.
 
 
 import wx
-import matplotlib
 from constants import events
 from lib.event import trigger
-
-matplotlib.use('WXAgg')
+from lib.jobs import set_dispatcher
 
 from frames.main import MainWindow
 
 
 class DSPApp(wx.App):
     def OnInit(self):
+        set_dispatcher(wx.CallAfter)
         self.window = MainWindow()
         self.SetTopWindow(self.window)
         trigger(events.EVENT_APP_STARTED)
@@ -12,6 +12,7 @@ from data import data_factory, SOURCE_DATA_TYPES_LINE
 from lib.config import app_config
 from lib.event import trigger, on
 from lib.i18n import gettext as _
+from lib.jobs import scheduler
 from lib.log import get_logger
 from ui.frames import progress
 from ui.panels import info_panels
@@ -135,15 +136,27 @@ class MainWindow(wx.Frame):
 
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
-            self.data = data_factory(path)
-            trigger(events.EVENT_DATA_LOADED, data=self.data)
-            self.visualizer = self.VisualizerClass(self.canvas_panel, self.data, self)
+            scheduler.submit(data_factory, path, callback=self.on_data_loaded, errback=self.on_data_load_failed,
+                group='data')
+
+    def on_data_load_failed(self, error):
+        wx.MessageBox(_('Data is not loaded: %s') % unicode(error), _('Error'), style=wx.OK | wx.ICON_ERROR, parent=self)
+
+    def on_data_loaded(self, data):
+        self.data = data
+        trigger(events.EVENT_DATA_LOADED, data=self.data)
+        self.visualizer = self.VisualizerClass(self.canvas_panel, self.data, self)
 
     def on_choose_visualizer(self, event, visualizer_class=None):
         self.VisualizerClass = visualizer_class
-        self.visualizer = visualizer_class(self.canvas_panel, self.data, self) if visualizer_class is not None else None
+        if self.data is not None:
+            self.visualizer = visualizer_class(self.canvas_panel, self.data, self) if visualizer_class is not None else None
 
     def on_export_image(self, event):
+        if self.visualizer is None or self.visualizer.canvas is None:
+            wx.MessageBox(_('There is no plot to export yet'), _('Error'), style=wx.OK | wx.ICON_ERROR, parent=self)
+            return
+
         file_choices = "PNG (*.png)|*.png"
 
         dlg = wx.FileDialog(
@@ -156,7 +169,9 @@ class MainWindow(wx.Frame):
 
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
-            self.visualizer.print_figure(path)
+            if not self.visualizer.print_figure(path):
+                wx.MessageBox(_('There is no plot to export yet'), _('Error'), style=wx.OK | wx.ICON_ERROR,
+                              parent=self)
 
     def on_exit(self, event):
         self.Destroy()
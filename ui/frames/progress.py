@@ -6,20 +6,12 @@ import wx
 
 from constants import events
 from lib.config import app_config
-from lib.event import trigger, on
 from lib.i18n import gettext as _
 from lib.log import get_logger
 
 
 logger = get_logger('dsp.main_window')
 
-DEFAULT_PROGRESS_CONFIG = {
-    'main_progress_max': 100,
-    'main_progress_position': 0,
-    'main_progress_visible': False,
-}
-trigger(events.DO_UPDATE_CONFIG, DEFAULT_PROGRESS_CONFIG)
-
 
 class ProgressWindow(wx.Frame):
     SIZE = (300, 20)
@@ -72,23 +64,14 @@ common_progress = None
 def setup(parent=None):
     global common_progress
     common_progress = ProgressWindow(parent)
+    app_config.on(events.EVENT_CHANGED_PARAMETER_key('main_progress_visible'), _on_progress_visible)
 
+def _on_progress_visible(key, value):
+    # the window is recreated for the next progress after the current event is handled
+    if not value:
+        wx.CallAfter(_renew)
 
-def progress_max(max_position=None):
-    if max_position is not None:
-        app_config.main_progress_max = max_position
-    return app_config.main_progress_max
-
-def progress_tick(add=1):
-    app_config.main_progress_position += add
-
-def progress_new(max_position=None):
-    progress_max(max_position)
-    app_config.main_progress_position = 0
-    app_config.main_progress_visible = True
-
-def progress_release():
-    app_config.main_progress_visible = False
+def _renew():
     global common_progress
     if common_progress:
         progress = common_progress.morph()
@@ -3,14 +3,20 @@
 Set of panels to show state information
 """
 
+import logging
+from collections import deque
+
 import wx
-import numpy as np
 
 from constants import events
 from lib.config import app_config
 from lib.event import on, trigger
 from lib.i18n import gettext as _
-from lib.log import subscribe
+from lib.jobs import Job, scheduler
+from lib.log import get_listener
+from processing.stats import RunningStats
+from processing.transients import get_transients
+from processing.wavelets import MODES, WAVELETS, wavelet_engine
 
 
 class BaseInfo(wx.Panel):
@@ -92,12 +98,18 @@ class Values(BaseInfo):
         (_('Range of vibration'), 'range_vibration'),
         (_('Average value'), 'avg'),
         (_('Effective value'), 'avg_sqr'),
+        (_('Crest factor'), 'crest'),
+        (_('Skewness'), 'skewness'),
+        (_('Kurtosis'), 'kurtosis'),
     )
 
     def _get_sizer(self):
         return wx.BoxSizer(wx.HORIZONTAL)
 
     def _init(self):
+        self.signal_id = 0
+        self.stats = {} # signal id -> RunningStats or Job building them
+
         self.list_box_files = wx.ListBox(self)
         self.sizer.Add(self.list_box_files, 1, wx.EXPAND, 0)
 
@@ -107,6 +119,8 @@ class Values(BaseInfo):
         self.sizer.Add(self.list_ctrl_info, 1, wx.EXPAND, 0)
 
         on(events.EVENT_DATA_LOADED, self.on_data_load)
+        self.conf.on([events.EVENT_CHANGED_PARAMETER_key('draw_position'),
+                      events.EVENT_CHANGED_PARAMETER_key('draw_page_size')], self.on_frame_changed)
         self.list_box_files.Bind(wx.EVT_LISTBOX, self.on_select_signal)
 
     def on_select_signal(self, event):
@@ -114,6 +128,11 @@ class Values(BaseInfo):
         trigger(events.EVENT_PANELS_FILES_SELECTED, signal_id=event.Int, signal=self.data[event.Int])
 
     def on_data_load(self, *args, **kwargs):
+        for stats in self.stats.values():
+            if isinstance(stats, Job):
+                stats.cancel()
+        self.stats = {}
+
         # init file list
         self.list_box_files.SetItems([f.file_name for f in self.data])
         self.list_box_files.Select(0)
@@ -121,71 +140,100 @@ class Values(BaseInfo):
         # init signal info
         self._show_signal_info()
 
+    def on_frame_changed(self, key, value):
+        if self.data:
+            self._show_signal_info(self.signal_id)
+
+    def _get_stats(self, signal_id):
+        """Returns RunningStats of the signal or None while they are built in background"""
+        stats = self.stats.get(signal_id)
+        if stats is None:
+            stats = self.stats[signal_id] = scheduler.submit(RunningStats, self.data[signal_id].float_data,
+                callback=lambda stats: self.on_stats_built(signal_id, stats))
+        return None if isinstance(stats, Job) else stats
+
+    def on_stats_built(self, signal_id, stats):
+        self.stats[signal_id] = stats
+        if signal_id == self.signal_id:
+            self._show_signal_info(signal_id)
+
     def _show_signal_info(self, signal_id=0):
+        self.signal_id = signal_id
         self.list_ctrl_info.DeleteAllItems()
         data = self.data[signal_id]
+        running_stats = self._get_stats(signal_id)
+        stats = running_stats.window(*self._frame()) if running_stats is not None else None
         for field, func_name in self._fields:
-            self._insert_entry(field, unicode(getattr(self, func_name)(data)))
+            if stats is not None:
+                value = unicode(getattr(self, func_name)(data, stats))
+            else:
+                value = '...' if running_stats is None else '-'
+            self._insert_entry(field, value)
 
     def _insert_entry(self, label, value):
         index = self.list_ctrl_info.GetItemCount()
         self.list_ctrl_info.InsertStringItem(index, label)
         self.list_ctrl_info.SetStringItem(index, 1, value)
 
-    def _f(self, data):
+    def _frame(self):
         position = self.conf.draw_position
         page_size = self.conf.draw_page_size
         floor = int(position - page_size if position > page_size else 0)
         ceil = int(position if position >= page_size else page_size)
-        return np.array(data.float_data[floor:ceil])
+        return floor, ceil
 
-    def num(self, data):
-        return len(self._f(data))
+    def num(self, data, stats):
+        return stats.count
 
-    def range(self, data):
-        position = self.conf.draw_position
-        page_size = self.conf.draw_page_size
-        floor = int(position - page_size if position > page_size else 0)
-        ceil = int(position if position >= page_size else page_size)
+    def range(self, data, stats):
+        floor, ceil = self._frame()
         return '%.4f - %.4f sec' % (data.to_time(floor), data.to_time(ceil))
 
-    def abs_max(self, data):
-        d = self._f(data)
-        return np.abs(np.max(d))
+    def abs_max(self, data, stats):
+        return abs(stats.max)
+
+    def abs_min(self, data, stats):
+        return abs(stats.min)
+
+    def avg(self, data, stats):
+        return stats.mean
+
+    def power(self, data, stats):
+        return stats.power
 
-    def abs_min(self, data):
-        d = self._f(data)
-        return np.abs(np.min(d))
+    def range_vibration(self, data, stats):
+        return stats.peak_to_peak
 
-    def avg(self, data):
-        d = self._f(data)
-        return np.average(d)
+    def avg_sqr(self, data, stats):
+        return stats.rms
 
-    def power(self, data):
-        d = self._f(data)
-        return np.average(np.square(d))
+    def crest(self, data, stats):
+        return stats.crest
 
-    def range_vibration(self, data):
-        d = self._f(data)
-        return np.max(d) - np.min(d)
+    def skewness(self, data, stats):
+        return stats.skewness
 
-    def avg_sqr(self, data):
-        import math
-        return math.sqrt(self.power(data))
+    def kurtosis(self, data, stats):
+        return stats.kurtosis
 
 
 class Properties(BaseInfo):
     slider_label = _('Frame position: %s/%s')
     zoom_label = _('Zoom: %s%% (width: %s)')
+    transients_label = _('Transients: %s')
+    transient_label = _('Transient %s/%s')
 
     ZOOM_DIM = 1000000
 
     def _init(self):
         self.max_data_size = 0
+        self.transients = None
 
         # init ui
         self._create_slider()
         self._create_zoom()
+        self._create_transients()
+        self._create_wavelet_props()
         self._create_color_props()
 
         # bind events
@@ -194,6 +242,11 @@ class Properties(BaseInfo):
         self.slider.Bind(wx.EVT_SCROLL_THUMBTRACK, self.evt_update_scroll_label)
         self.zoom.Bind(wx.EVT_SCROLL_ENDSCROLL, self.evt_set_config_zoom)
         self.zoom.Bind(wx.EVT_SCROLL_THUMBTRACK, self.evt_update_zoom_label)
+        self.button_previous_transient.Bind(wx.EVT_BUTTON, self.evt_on_previous_transient)
+        self.button_next_transient.Bind(wx.EVT_BUTTON, self.evt_on_next_transient)
+        self.choice_wavelet.Bind(wx.EVT_CHOICE, self.evt_on_select_wavelet)
+        self.choice_wavelet_mode.Bind(wx.EVT_CHOICE, self.evt_on_select_wavelet_mode)
+        self.spin_wavelet_level.Bind(wx.EVT_SPINCTRL, self.evt_on_set_wavelet_level)
 
         self.button_facecolor.Bind(wx.EVT_COLOURPICKER_CHANGED, self.evt_on_select_bg_colour)
         self.button_static_cursor_color.Bind(wx.EVT_COLOURPICKER_CHANGED, self.evt_on_select_static_cursor_color)
@@ -225,6 +278,89 @@ class Properties(BaseInfo):
             self.zoom.SetValue(self._zoom_get_zoom_value_from_page_size())
         self.zoom_text.SetLabel(self.zoom_label % (self._zoom_get_percent(), self._zoom_get_page_size()))
 
+    def _create_transients(self):
+        self.transients_box = wx.StaticBox(self, label=_('Transients'))
+        self.transients_box_sizer = wx.StaticBoxSizer(self.transients_box)
+
+        self.button_previous_transient = wx.Button(self, label=_('< Previous'))
+        self.transients_box_sizer.Add(self.button_previous_transient, 0, wx.ALIGN_CENTER_VERTICAL)
+        self.button_next_transient = wx.Button(self, label=_('Next >'))
+        self.transients_box_sizer.Add(self.button_next_transient, 0, wx.ALIGN_CENTER_VERTICAL)
+        self.transients_box_sizer.AddSpacer(20)
+
+        self.transients_text = wx.StaticText(self, label=self.transients_label % '~')
+        self.transients_box_sizer.Add(self.transients_text, 0, wx.ALIGN_CENTER_VERTICAL)
+
+        self.sizer.Add(self.transients_box_sizer, 0, wx.EXPAND)
+        self._update_transients()
+
+    def _update_transients(self):
+        found = self.transients is not None and len(self.transients.offsets) > 0
+        self.button_previous_transient.Enable(found)
+        self.button_next_transient.Enable(found)
+        self.transients_text.SetLabel(self.transients_label % (
+            len(self.transients.offsets) if self.transients is not None else '~'))
+
+    def _jump_to_transient(self, direction):
+        """Moves the page to the centre of the next (``direction`` > 0) or previous transient"""
+        page_size = int(self.conf.draw_page_size)
+        position = int(self.conf.draw_position)
+        centre = max(position, page_size) - page_size // 2
+        centres = self.transients.offsets + self.transients.durations // 2
+        if direction > 0:
+            index = centres.searchsorted(centre, 'right')
+        else:
+            index = centres.searchsorted(centre, 'left') - 1
+        if not 0 <= index < len(centres):
+            return
+
+        # a long transient is shown whole
+        page_size = max(page_size, int(self.transients.durations[index]))
+        position = min(max(int(centres[index]) + page_size // 2, page_size), max(self.max_data_size, page_size))
+        with self.conf.batch():
+            self.conf.draw_page_size = page_size
+            self.conf.draw_position = position
+        self.slider.SetValue(position)
+        self.slider_text.SetLabel(self.slider_label % (position, self.max_data_size))
+        self._update_zoom()
+        self.transients_text.SetLabel(self.transient_label % (index + 1, len(centres)))
+
+    def _create_wavelet_props(self):
+        self.wavelet_box = wx.StaticBox(self, label=_('Wavelets'))
+        self.wavelet_box_sizer = wx.StaticBoxSizer(self.wavelet_box)
+
+        self.wavelet_box_sizer.Add(wx.StaticText(self, label=_('Wavelet:')), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.choice_wavelet = wx.Choice(self, choices=WAVELETS)
+        if self.conf.draw_wavelet in WAVELETS:
+            self.choice_wavelet.SetSelection(WAVELETS.index(self.conf.draw_wavelet))
+        self.wavelet_box_sizer.Add(self.choice_wavelet, 0, wx.ALIGN_CENTER_VERTICAL)
+        self.wavelet_box_sizer.AddSpacer(20)
+
+        self.wavelet_box_sizer.Add(wx.StaticText(self, label=_('Mode:')), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.choice_wavelet_mode = wx.Choice(self, choices=MODES)
+        if self.conf.draw_wavelet_mode in MODES:
+            self.choice_wavelet_mode.SetSelection(MODES.index(self.conf.draw_wavelet_mode))
+        self.wavelet_box_sizer.Add(self.choice_wavelet_mode, 0, wx.ALIGN_CENTER_VERTICAL)
+        self.wavelet_box_sizer.AddSpacer(20)
+
+        self.wavelet_box_sizer.Add(wx.StaticText(self, label=_('Level:')), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.spin_wavelet_level = wx.SpinCtrl(self, min=1, max=max(self.conf.draw_wavelet_level, 1),
+                                              initial=self.conf.draw_wavelet_level)
+        self.wavelet_box_sizer.Add(self.spin_wavelet_level, 0, wx.ALIGN_CENTER_VERTICAL)
+
+        self.sizer.Add(self.wavelet_box_sizer, 0, wx.EXPAND)
+
+    def _update_wavelet_level(self):
+        """Limits the level by the deepest decomposition of the shortest signal"""
+        data = self.data
+        if not data:
+            return
+        max_level = max(min(wavelet_engine.max_level(signal, self.conf.draw_wavelet) for signal in data), 1)
+        self.spin_wavelet_level.SetRange(1, max_level)
+        if self.conf.draw_wavelet_level > max_level:
+            self.conf.draw_wavelet_level = max_level
+        self.spin_wavelet_level.SetValue(self.conf.draw_wavelet_level)
+
     def _create_color_props(self):
         self.colour_box = wx.StaticBox(self, label=_('Colours'))
         self.colour_box_sizer = wx.StaticBoxSizer(self.colour_box)
@@ -249,9 +385,21 @@ class Properties(BaseInfo):
         data = self.data
         if data:
             self.max_data_size = data.max_data_size()
-            self.conf.draw_page_size = data.pluck('slice_freq').next()
+            with self.conf.batch():
+                self.conf.draw_page_size = data.pluck('slice_freq').next()
+                self.conf.draw_position = 0
             self._update_slider()
             self._update_zoom()
+            self._update_wavelet_level()
+
+            # the index is built in background once per recording, see processing.transients
+            self.transients = None
+            self._update_transients()
+            scheduler.submit(get_transients, data, callback=self.on_transients_found, group='transients')
+
+    def on_transients_found(self, transients):
+        self.transients = transients
+        self._update_transients()
 
     def evt_update_scroll_label(self, event):
         self.slider_text.SetLabel(self.slider_label % (self.slider.GetValue(), self.max_data_size))
@@ -265,6 +413,23 @@ class Properties(BaseInfo):
     def evt_set_config_zoom(self, event):
         self.conf.draw_page_size = self._zoom_get_page_size()
 
+    def evt_on_previous_transient(self, event):
+        self._jump_to_transient(-1)
+
+    def evt_on_next_transient(self, event):
+        self._jump_to_transient(1)
+
+    def evt_on_select_wavelet(self, event):
+        with self.conf.batch():
+            self.conf.draw_wavelet = WAVELETS[self.choice_wavelet.GetSelection()]
+            self._update_wavelet_level()
+
+    def evt_on_select_wavelet_mode(self, event):
+        self.conf.draw_wavelet_mode = MODES[self.choice_wavelet_mode.GetSelection()]
+
+    def evt_on_set_wavelet_level(self, event):
+        self.conf.draw_wavelet_level = self.spin_wavelet_level.GetValue()
+
     def evt_on_select_bg_colour(self, event):
         self.conf.draw_facecolor = '#{:02X}{:02X}{:02X}'.format(*event.Colour.Get())
 
@@ -276,11 +441,55 @@ class Properties(BaseInfo):
 
 
 class Log(BaseInfo):
+    LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR)
+
     def _init(self):
+        self.choice_level = wx.Choice(self, choices=[logging.getLevelName(level) for level in self.LEVELS])
+        if self.conf.log_level in self.LEVELS:
+            self.choice_level.SetSelection(self.LEVELS.index(self.conf.log_level))
+        self.sizer.Add(self.choice_level, 0, wx.ALIGN_LEFT)
+
         self.text_ctrl_log = wx.TextCtrl(self, style=wx.TE_MULTILINE|wx.TE_READONLY)
         self.sizer.Add(self.text_ctrl_log, 1, wx.EXPAND, 0)
 
-        subscribe(self.on_log)
-
-    def on_log(self, msg):
-        self.text_ctrl_log.AppendText(msg + '\n\n')
\ No newline at end of file
+        self.last_record = 0    # number of the last record taken from the listener
+        self.lengths = deque()  # lengths of shown records
+
+        # records are taken from the listener buffer in batches, nothing is done while the panel is hidden
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_flush, self.timer)
+        self.timer.Start(self.conf.log_refresh_interval)
+
+        self.choice_level.Bind(wx.EVT_CHOICE, self.evt_on_select_level)
+        self.conf.on(events.EVENT_CHANGED_PARAMETER_key('log_level'), self.on_level_changed)
+
+    def evt_on_select_level(self, event):
+        self.conf.log_level = self.LEVELS[self.choice_level.GetSelection()]
+
+    def on_level_changed(self, key, value):
+        # show buffered records again with the new level
+        self.text_ctrl_log.Clear()
+        self.lengths.clear()
+        self.last_record = 0
+        self.on_flush()
+
+    def on_flush(self, event=None):
+        listener = get_listener()
+        if listener is None or not self.IsShownOnScreen():
+            return
+        records = listener.since(self.last_record)
+        if not records:
+            return
+        self.last_record = records[-1][0]
+
+        max_lines = self.conf.log_max_lines
+        messages = [msg + '\n\n' for number, level, msg in records if level >= self.conf.log_level][-max_lines:]
+        if not messages:
+            return
+        self.text_ctrl_log.Freeze()
+        self.text_ctrl_log.AppendText(''.join(messages))
+        self.lengths.extend(len(msg) for msg in messages)
+        excess = len(self.lengths) - max_lines
+        if excess > 0:
+            self.text_ctrl_log.Remove(0, sum(self.lengths.popleft() for _i in xrange(excess)))
+        self.text_ctrl_log.Thaw()
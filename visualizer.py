@@ -4,16 +4,18 @@ Set of classes to represent the data
 """
 import wx
 import numpy as np
-from matplotlib import ticker
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigCanvas
-from matplotlib.widgets import MultiCursor
 
 from constants import events
 from lib.config import app_config
 from lib.event import app_events, trigger, on
 from lib.i18n import gettext as _
-from ui.frames.progress import progress_new, progress_release, progress_tick
+from lib.jobs import scheduler, check_cancelled
+from processing.pyramid import MinMaxPyramid
+from processing.spectrogram import get_spectrogram
+from processing.spectrum import signal_frequency, spectrum_engine
+from processing.trends import get_trends
+from processing.wavelets import wavelet_engine
+from lib.progress import progress_new, progress_release, progress_tick
 
 
 VISUALIZERS = []
@@ -31,13 +33,38 @@ DEFAULT_DRAW_CONFIG = {
     'draw_plot_grid': True,
     'draw_plot_xlabel': 't, c',
     'draw_plot_title_color': '#395404',
+    'draw_spectre_window': 'boxcar',    # see processing.spectrum.WINDOWS
+    'draw_spectre_nfft': None,          # None - next fast length of the page
+    'draw_psd_window': 'hanning',
+    'draw_psd_overlap': 0.5,
+    'draw_spectrogram_nfft': 256,
+    'draw_wavelet': 'db20',
+    'draw_wavelet_mode': 'sp1',
+    'draw_wavelet_level': 1,
+    'draw_trend_window': 1024,
+    'draw_trend_step': 512,
 }
 app_events.trigger(events.DO_UPDATE_CONFIG, DEFAULT_DRAW_CONFIG)
+app_config.debounce('draw_position', 0.05)
+
+
+class Cursor(object):
+    """Dynamic cursor: vertical line and value label on each plot"""
+    def __init__(self):
+        self.lines = []
+        self.val_texts = []
 
 
 class BaseVisualizer(object):
+    """
+    Cursors, value labels and other artists marked as animated are excluded
+    from the full canvas redraw. After each full draw the static background
+    of every plot is cached, then animated artists are updated by ``blit``.
+    """
     visualizer_name = _('Base Visualizer')
 
+    BLIT_LABELS_HEIGHT = 24 # pixels over a plot reserved for value labels
+
     def __init__(self, canvas_panel, data, parent_frame):
         trigger(events.EVENT_VISUALIZER_DRAW, visualizer=self)
         self.conf = app_config
@@ -50,9 +77,33 @@ class BaseVisualizer(object):
         self.events = app_events
         self.plots = []
         self.vline = []
-
-        # calculate data
-        self.process()
+        self.cursor = Cursor()
+        self.backgrounds = None
+        self.fig = None
+        self.canvas = None
+        self.subscriptions = []
+        self.cids = []
+
+        # calculate data in background, the canvas is prepared when it's ready
+        self.schedule(self.on_processed)
+
+    def schedule(self, callback):
+        """
+        Runs ``compute`` in background, ``callback(processed_data)`` is called in the main loop.
+        A new job cancels the previous one of any visualizer.
+        """
+        return scheduler.submit(self.compute, callback=callback, errback=self.on_compute_failed, group='visualizer')
+
+    def on_compute_failed(self, error):
+        wx.MessageBox(_('Data is not processed: %s') % unicode(error), _('Error'), style=wx.OK | wx.ICON_ERROR,
+                      parent=self.frame)
+
+    def on_processed(self, processed_data):
+        # the plotting stack is loaded by the first visualizer, not at the app start
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigCanvas
+
+        self.processed_data = processed_data
 
         # prepare canvas
         self.canvas_width, self.canvas_height = self.canvas_panel.Size
@@ -63,43 +114,49 @@ class BaseVisualizer(object):
             figsize=figsize
         )
         self.canvas = FigCanvas(self.canvas_panel, -1, self.fig)
+        self.on('draw_event', self.on_draw_event)
 
         # display controls
         self.draw()
 
         # bind events
+        # app events reference the visualizer weakly, so a replaced one isn't kept alive by them
         self.canvas_panel.Bind(wx.EVT_SIZE, self.evt_on_resize_panel)
-        on(events.EVENT_VISUALIZER_DRAW, self.on_any_visualizer_draw)
-        self.conf.on(events.EVENT_CHANGED_PARAMETER_key('draw_*'), self.on_config_changed)
+        self.subscriptions = [
+            on(events.EVENT_VISUALIZER_DRAW, self.on_any_visualizer_draw, weak=True),
+            self.conf.on(events.EVENT_CHANGED_PARAMETER_key('draw_*'), self.on_config_changed, weak=True),
+        ]
         self.on('button_press_event', self.on_button_press_event)
         self.on('motion_notify_event', self.on_motion_notify_event)
 
     def create_cursor(self):
-        if self.plots:
-            self.cursor = MultiCursor(self.fig.canvas, self.plots, color=self.conf.draw_dynamic_cursor_color, lw=1)
-            self.cursor.val_texts = []
-            for i, plot in enumerate(self.plots):
-                val_text = plot.text(0.15, 1.04, '', transform=plot.transAxes, fontsize=9, color=self.conf.draw_dynamic_cursor_color)
-                val_text.plot = plot
-                val_text.data = self.processed_data[i]
-                self.cursor.val_texts.append(val_text)
+        self.cursor = Cursor()
+        for i, plot in enumerate(self.plots):
+            line = plot.axvline(color=self.conf.draw_dynamic_cursor_color, lw=1, visible=False, animated=True)
+            self.cursor.lines.append(line)
+
+            val_text = plot.text(0.15, 1.04, '', transform=plot.transAxes, fontsize=9,
+                color=self.conf.draw_dynamic_cursor_color, animated=True)
+            val_text.plot = plot
+            val_text.data = self.processed_data[i]
+            self.cursor.val_texts.append(val_text)
 
     def create_vline(self):
         for i, plot in enumerate(self.plots):
-            line = plot.axvline(color=self.conf.draw_static_cursor_color)
+            line = plot.axvline(color=self.conf.draw_static_cursor_color, animated=True)
             line.plot = plot
             line.data = self.processed_data[i]
-            line.val_text = plot.text(0.05, 1.04, '', transform=plot.transAxes, fontsize=9, color=self.conf.draw_static_cursor_color)
+            line.val_text = plot.text(0.05, 1.04, '', transform=plot.transAxes, fontsize=9,
+                color=self.conf.draw_static_cursor_color, animated=True)
             self.vline.append(line)
 
     def on(self, event, func):
         """ Canvas events """
-        self.fig.canvas.mpl_connect(event, func)
+        self.cids.append(self.fig.canvas.mpl_connect(event, func))
 
     def on_any_visualizer_draw(self, visualizer):
-        if visualizer is not self:
-            self.clear()
-            self.conf.off(events.EVENT_CHANGED_PARAMETER_key('draw_*'), [self.on_config_changed])
+        if visualizer is not self and self.canvas is not None:
+            self.destroy()
 
     def on_config_changed(self, key, value):
         if key in ('draw_position', 'draw_page_size'):
@@ -109,11 +166,11 @@ class BaseVisualizer(object):
         elif key == 'draw_static_cursor_color':
             for line in self.vline:
                 line.set_color(value)
-            self.canvas.draw()
+            self.blit()
         elif key == 'draw_dynamic_cursor_color':
             for line in self.cursor.lines:
                 line.set_color(value)
-            self.canvas.draw()
+            self.blit()
 
     def on_button_press_event(self, event):
         self.update_vline(event)
@@ -121,6 +178,7 @@ class BaseVisualizer(object):
             self.events.trigger(events.EVENT_VISUALIZER_STATIC_CURSOR_CHANGED, plot_event=event, data=self.processed_data)
 
     def on_motion_notify_event(self, event):
+        self.update_cursor(event)
         self.update_cursor_label(event)
         if event.inaxes is not None and self.canvas.widgetlock.available(self):
             self.events.trigger(events.EVENT_VISUALIZER_DYNAMIC_CURSOR_CHANGED, plot_event=event, data=self.processed_data)
@@ -138,12 +196,45 @@ class BaseVisualizer(object):
             data.to_time(event.xdata),
             data.to_value(event.xdata))
 
+    def on_draw_event(self, event):
+        self.backgrounds = [self.canvas.copy_from_bbox(self._blit_bbox(plot)) for plot in self.plots]
+        for plot in self.plots:
+            self._draw_animated(plot)
+
+    def _blit_bbox(self, plot):
+        from matplotlib.transforms import Bbox
+        bbox = plot.bbox
+        return Bbox.from_extents(bbox.x0, bbox.y0, bbox.x1, bbox.y1 + self.BLIT_LABELS_HEIGHT)
+
+    def _draw_animated(self, plot):
+        for artist in plot.lines + plot.texts:
+            if artist.get_animated():
+                plot.draw_artist(artist)
+
+    def blit(self):
+        """Redraws animated artists over the cached backgrounds of plots"""
+        if self.backgrounds is None or len(self.backgrounds) != len(self.plots):
+            self.canvas.draw()
+            return
+        for plot, background in zip(self.plots, self.backgrounds):
+            self.canvas.restore_region(background)
+            self._draw_animated(plot)
+            self.canvas.blit(self._blit_bbox(plot))
+
     def update_vline(self, event):
         if event.inaxes:
             for line in self.vline:
                 line.set_xdata(event.xdata)
                 line.val_text.set_text(self._prepare_static_cursor_value(line.data, event))
-            self.canvas.draw()
+            self.blit()
+
+    def update_cursor(self, event):
+        visible = event.inaxes is not None
+        for line in self.cursor.lines:
+            line.set_visible(visible)
+            if visible:
+                line.set_xdata(event.xdata)
+        self.blit()
 
     def _prepare_dynamic_cursor_label(self, data, event):
         return '(%.3f, %.3f)' % (
@@ -154,13 +245,17 @@ class BaseVisualizer(object):
         if event.inaxes and False: #disabled
             for text in self.cursor.val_texts:
                 text.set_text(self._prepare_dynamic_cursor_label(text.data, event))
-            self.canvas.draw()
+            self.blit()
+
+    def get_frame(self):
+        """Returns (first, last) positions of the visible page"""
+        position = int(self.conf.draw_position)
+        page_size = int(self.conf.draw_page_size)
+        return (position - page_size if position > page_size else 0,
+                position if position >= page_size else page_size)
 
     def update_plots(self):
-        position = self.conf.draw_position
-        page_size = self.conf.draw_page_size
-        frame = (position - page_size if position > page_size else 0,
-                 position if position >= page_size else page_size)
+        frame = self.get_frame()
         for plt in self.plots:
             plt.set_xlim(frame)
         self.canvas.draw()
@@ -184,32 +279,66 @@ class BaseVisualizer(object):
 
     def clear(self):
         """Clear canvas"""
+        self.plots = []
+        self.backgrounds = None
         self.canvas.figure.clear()
         self.canvas.draw()
 
+    def destroy(self):
+        """Unbinds the visualizer from app events and the panel, destroys the canvas"""
+        for subscription in self.subscriptions:
+            subscription.off()
+        self.subscriptions = []
+        self.canvas_panel.Unbind(wx.EVT_SIZE, handler=self.evt_on_resize_panel)
+        for cid in self.cids:
+            self.canvas.mpl_disconnect(cid)
+        self.cids = []
+        self.plots = []
+        self.backgrounds = None
+        self.fig.clear()
+        self.canvas.Destroy()
+        self.canvas = None
+
     def process(self):
         """Calculates needed information"""
-        self.processed_data = self.data
+        self.processed_data = self.compute()
+
+    def compute(self):
+        """Returns processed data. It's called in a background job, so it must not touch UI"""
+        return self.data
 
     def print_figure(self, path):
-        """Export canvas into the file ``path``"""
+        """Export canvas into the file ``path``, returns False if nothing is drawn yet"""
+        if self.canvas is None:
+            return False
         self.canvas.print_figure(path, dpi=self.conf.draw_dpi)
+        return True
 
 
 class SignalsMapVisualizer(BaseVisualizer):
     visualizer_name = _('Clear Signals Map Visualizer')
 
-    def process(self):
-        self.processed_data = self.data
+    def compute(self):
+        # computed once, before the plots are created
+        self.pyramids = [MinMaxPyramid(data.float_data) for data in self.data]
+        return self.data
+
+    def _envelope(self, i, frame):
+        # two points (min and max) per pixel column are enough to keep the shape of peaks
+        return self.pyramids[i].envelope(frame[0], frame[1], points=self.canvas_width)
 
     def create_plots(self):
+        from matplotlib import ticker
+
+        frame = self.get_frame()
         for i, data in enumerate(self.processed_data, 1):
             plt = self.canvas.figure.add_subplot(len(self.processed_data), 1, i)
 
             plt.set_title('%s signal' % i, fontsize=9, x=0.02, color=self.conf.draw_plot_title_color)
 
-            plt.set_xlim([0, self.conf.draw_page_size])
-            plt.plot(data.float_data, color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
+            plt.set_xlim(frame)
+            plt.signal_lines = plt.plot(*self._envelope(i - 1, frame),
+                color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
             plt.grid(self.conf.draw_plot_grid)
 
             plt.set_xlabel(self.conf.draw_plot_xlabel, fontsize=9, color=self.conf.draw_plot_title_color)
@@ -234,36 +363,32 @@ class SignalsMapVisualizer(BaseVisualizer):
         self.canvas.draw()
         progress_release()
 
+    def update_plots(self):
+        frame = self.get_frame()
+        for i, plt in enumerate(self.plots):
+            plt.signal_lines[0].set_data(*self._envelope(i, frame))
+            plt.set_xlim(frame)
+        self.canvas.draw()
 
-class SpectreVisualizer(BaseVisualizer):
-    visualizer_name = _('Spectre Visualizer')
-
-    def process(self):
-        from scipy import fftpack
-
-        def get_spectrum(signal, fq):
-            signal = np.array(signal)
-            n = len(signal)
-            half = n / 2
-            tm = float(n) / fq # time
-
-            FFT = fftpack.fft(signal) / n
-
-            frq = np.arange(half) / tm
-            return frq, np.abs(FFT[:half])
+    def evt_on_resize_panel(self, event):
+        resized = self.canvas_width != self.canvas_panel.Size[0]
+        super(SignalsMapVisualizer, self).evt_on_resize_panel(event)
+        if resized:
+            self.update_plots()
 
-        self.processed_data = []
-        for data in self.data:
-            fq = data.header.data_size / data.header.total_rcv_time
 
-            position = self.conf.draw_position
-            page_size = self.conf.draw_page_size
-            frame = (int(position - page_size if position > page_size else 0),
-                     int(position if position >= page_size else page_size))
+class SpectreVisualizer(BaseVisualizer):
+    visualizer_name = _('Spectre Visualizer')
 
-            spectrum = get_spectrum(data.float_data[slice(*frame)], fq)
+    def compute(self):
+        return spectrum_engine.spectra(self.data, self.get_frame(),
+            window=self.conf.draw_spectre_window, nfft=self.conf.draw_spectre_nfft)
 
-            self.processed_data.append(spectrum)
+    def on_config_changed(self, key, value):
+        if key in ('draw_spectre_window', 'draw_spectre_nfft'):
+            self.update_plots()
+        else:
+            super(SpectreVisualizer, self).on_config_changed(key, value)
 
     def create_plots(self):
         for i, data in enumerate(self.processed_data, 1):
@@ -272,7 +397,8 @@ class SpectreVisualizer(BaseVisualizer):
             plt.set_title('%s signal' % i, fontsize=9, x=0.02, color=self.conf.draw_plot_title_color)
 
             fq, amp = data
-            lines = plt.plot(fq, amp, color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
+            lines = plt.plot(fq, amp, color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle,
+                             animated=True)
             plt.fq_amp_lines = lines
             plt.grid(self.conf.draw_plot_grid)
 
@@ -296,7 +422,10 @@ class SpectreVisualizer(BaseVisualizer):
         progress_release()
 
     def update_plots(self):
-        self.process()
+        self.schedule(self.on_spectra_updated)
+
+    def on_spectra_updated(self, processed_data):
+        self.processed_data = processed_data
         for i, data in enumerate(self.processed_data):
             plt = self.plots[i]
             fq, amp = data
@@ -304,12 +433,11 @@ class SpectreVisualizer(BaseVisualizer):
             line.set_xdata(fq)
             line.set_ydata(amp)
 
-        self.canvas.draw()
+        # axes limits are kept, so only the spectrum lines have to be redrawn
+        self.blit()
 
     def _to_amp(self, data, x):
-        from scipy.interpolate import splrep, splev
-        tck = splrep(data[0], data[1], k=1, s=0)
-        return splev(x, tck)
+        return np.interp(x, data[0], data[1])
 
     def _prepare_static_cursor_value(self, data, event):
         return '(%.3f, %.3f)' % (
@@ -319,18 +447,38 @@ class SpectreVisualizer(BaseVisualizer):
 class WaveletsVisualizer(BaseVisualizer):
     visualizer_name = _('Wavelets Visualizer')
 
-    def process(self):
-        import pywt
-        self.processed_data = []
-        for data in (d.clone() for d in self.data):
-            data.float_data = pywt.dwt(data.float_data, 'db20', 'sp1')
-            self.processed_data.append(data)
+    def compute(self):
+        level = self.conf.draw_wavelet_level
+        decompositions = wavelet_engine.decompose(self.data, level,
+            wavelet=self.conf.draw_wavelet, mode=self.conf.draw_wavelet_mode)
+        processed_data = []
+        for data, levels in zip(self.data, decompositions):
+            data = data.clone()
+            data.float_data = levels[-1] # (approximation, detail) of the chosen level
+            data.wavelet_level = level
+            processed_data.append(data)
+        return processed_data
+
+    def on_config_changed(self, key, value):
+        if key in ('draw_wavelet', 'draw_wavelet_mode', 'draw_wavelet_level'):
+            self.schedule(self.on_wavelets_updated)
+        else:
+            super(WaveletsVisualizer, self).on_config_changed(key, value)
+
+    def on_wavelets_updated(self, processed_data):
+        self.processed_data = processed_data
+        for plt, line, data in zip(self.plots, self.vline, self.processed_data):
+            plt.wavelet_lines[0].set_data(np.arange(len(data.float_data[1])), data.float_data[1])
+            line.data = data
+        self.canvas.draw()
 
     def _to_sec(self, data, x):
-        t = np.linspace(0.0, data.header.total_rcv_time / 2, len(data.float_data[1]))
-        return t[int(round(x))]
+        # every level halves the rate, a coefficient of level ``k`` follows ``2 ** k`` samples
+        return x * 2 ** data.wavelet_level / signal_frequency(data)
 
     def create_plots(self):
+        from matplotlib import ticker
+
         for i, data in enumerate(self.processed_data, 1):
             plt = self.canvas.figure.add_subplot(len(self.processed_data), 1, i)
 
@@ -338,7 +486,8 @@ class WaveletsVisualizer(BaseVisualizer):
 
             plt.set_xlim([0, self.conf.draw_page_size])
 
-            plt.plot(data.float_data[1], color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
+            plt.wavelet_lines = plt.plot(data.float_data[1],
+                color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
 
             plt.grid(self.conf.draw_plot_grid)
 
@@ -346,7 +495,8 @@ class WaveletsVisualizer(BaseVisualizer):
             plt.xaxis.set_label_coords(1.03, -0.02)
 
             plt.xaxis.set_major_locator(ticker.LinearLocator(numticks=15))
-            plt.xaxis.set_major_formatter(ticker.FuncFormatter(func=lambda x, pos: '%.3f' % self._to_sec(data, x)))
+            plt.xaxis.set_major_formatter(ticker.FuncFormatter(
+                func=lambda x, pos, i=i-1: '%.3f' % self._to_sec(self.processed_data[i], x)))
 
             plt.tick_params(axis='both', which='major', labelsize=9)
             plt.tick_params(axis='both', which='minor', labelsize=7)
@@ -364,41 +514,74 @@ class WaveletsVisualizer(BaseVisualizer):
         self.canvas.draw()
         progress_release()
 
-    def update_plots(self):
-        position = self.conf.draw_position
-        page_size = self.conf.draw_page_size
-        frame = (position - page_size if position > page_size else 0,
-                 position if position >= page_size else page_size)
-        for plt in self.plots:
-            plt.set_xlim(frame)
-        self.canvas.draw()
-
     def _prepare_static_cursor_value(self, data, event):
         return '(%.3f, %.3f)' % (
             self._to_sec(data, event.xdata),
             data.float_data[1][int(round(event.xdata))])
 
 
+class AveragedSpectreVisualizer(SpectreVisualizer):
+    """Power spectral density averaged over all blocks of the recording (Welch method)"""
+    visualizer_name = _('Averaged Spectre Visualizer')
+
+    def compute(self):
+        return spectrum_engine.psd(self.data,
+            overlap=self.conf.draw_psd_overlap, window=self.conf.draw_psd_window)
+
+    def create_plots(self):
+        super(AveragedSpectreVisualizer, self).create_plots()
+        for plt in self.plots:
+            plt.set_yscale('log')
+
+    def on_config_changed(self, key, value):
+        if key in ('draw_psd_window', 'draw_psd_overlap'):
+            self.update_plots()
+        elif key not in ('draw_position', 'draw_page_size'):
+            # the whole recording is shown, there is nothing to update on scrolling
+            super(AveragedSpectreVisualizer, self).on_config_changed(key, value)
+
+
 class SpectrogramVisualizer(SpectreVisualizer):
+    """
+    Spectrogram of the whole file is computed once in background (see processing.spectrogram),
+    the view just picks tiles of the visible page.
+    """
     visualizer_name = _('Spectrogram Visualizer')
 
-    def process(self):
-        self.processed_data = []
+    def compute(self):
+        processed_data = []
         for data in self.data:
-            position = self.conf.draw_position
-            page_size = self.conf.draw_page_size
-            frame = (int(position - page_size if position > page_size else 0),
-                     int(position if position >= page_size else page_size))
+            check_cancelled()
+            processed_data.append(get_spectrogram(data.file_name, nfft=self.conf.draw_spectrogram_nfft))
+        return processed_data
 
-            self.processed_data.append(data.float_data[slice(*frame)])
+    def on_config_changed(self, key, value):
+        if key == 'draw_spectrogram_nfft':
+            self.schedule(self.on_spectrograms_updated)
+        else:
+            super(SpectrogramVisualizer, self).on_config_changed(key, value)
+
+    def on_spectrograms_updated(self, processed_data):
+        self.processed_data = processed_data
+        self.update_plots()
+
+    def update_plot(self, plt, tiles):
+        first, last = self.get_frame()
+        image, extent = tiles.image(first, last, columns=self.canvas_width)
+        plt.spectrogram_image.set_data(image)
+        plt.spectrogram_image.set_extent(extent)
+        if image.size:  # the recording is shorter than one segment
+            plt.spectrogram_image.set_clim(image.min(), image.max())
+        plt.set_xlim(extent[:2])
+        plt.set_ylim(extent[2:])
 
     def create_plots(self):
-        for i, data in enumerate(self.processed_data, 1):
+        for i, tiles in enumerate(self.processed_data, 1):
             plt = self.canvas.figure.add_subplot(len(self.processed_data), 1, i)
 
             plt.set_title('%s signal' % i, fontsize=9, x=0.02, color=self.conf.draw_plot_title_color)
-            origin_data = self.data[i-1]
-            plt.specgram(data, Fs=origin_data.header.data_size/origin_data.header.total_rcv_time)
+            plt.spectrogram_image = plt.imshow(np.zeros((1, 1)), aspect='auto', origin='lower', interpolation='nearest')
+            self.update_plot(plt, tiles)
 
             plt.grid(self.conf.draw_plot_grid)
             plt.xaxis.set_label_coords(1.03, -0.02)
@@ -421,13 +604,95 @@ class SpectrogramVisualizer(SpectreVisualizer):
         progress_release()
 
     def update_plots(self):
-        pass
+        for plt, tiles in zip(self.plots, self.processed_data):
+            self.update_plot(plt, tiles)
+        self.canvas.draw()
+
+
+class TrendsVisualizer(BaseVisualizer):
+    """
+    RMS, peak and dominant frequency of sliding windows over the whole recording
+    (see processing.trends), e.g. to follow a rotor run-down.
+    """
+    visualizer_name = _('Trends Visualizer')
+
+    def compute(self):
+        processed_data = []
+        for data in self.data:
+            check_cancelled()
+            processed_data.append(get_trends(data, size=self.conf.draw_trend_window, step=self.conf.draw_trend_step))
+        return processed_data
+
+    def on_config_changed(self, key, value):
+        if key in ('draw_trend_window', 'draw_trend_step'):
+            self.schedule(self.on_trends_updated)
+        elif key not in ('draw_position', 'draw_page_size'):
+            # the whole recording is shown, there is nothing to update on scrolling
+            super(TrendsVisualizer, self).on_config_changed(key, value)
+
+    def on_trends_updated(self, processed_data):
+        self.processed_data = processed_data
+        for plt, line, trends in zip(self.plots, self.vline, self.processed_data):
+            rms_line, peak_line = plt.trend_lines
+            rms_line.set_data(trends.times, trends.rms)
+            peak_line.set_data(trends.times, trends.peak)
+            plt.frequency_plot.lines[0].set_data(trends.times, trends.dominant_frequency)
+            for axes in (plt, plt.frequency_plot):
+                axes.relim()
+                axes.autoscale_view()
+            line.data = trends
+        self.canvas.draw()
+
+    def create_plots(self):
+        for i, trends in enumerate(self.processed_data, 1):
+            plt = self.canvas.figure.add_subplot(len(self.processed_data), 1, i)
+
+            plt.set_title('%s signal' % i, fontsize=9, x=0.02, color=self.conf.draw_plot_title_color)
+
+            plt.trend_lines = plt.plot(trends.times, trends.rms, trends.times, trends.peak,
+                color=self.conf.draw_plot_line_color, linestyle=self.conf.draw_plot_line_linestyle)
+            plt.trend_lines[1].set_alpha(0.4)
+            plt.grid(self.conf.draw_plot_grid)
+
+            plt.frequency_plot = plt.twinx()
+            plt.frequency_plot.plot(trends.times, trends.dominant_frequency,
+                color=self.conf.draw_static_cursor_color, linestyle='', marker='.', markersize=2)
+            plt.frequency_plot.set_ylabel('Fq, Hz', fontsize=9, color=self.conf.draw_static_cursor_color)
+
+            plt.set_xlabel(self.conf.draw_plot_xlabel, fontsize=9, color=self.conf.draw_plot_title_color)
+            plt.xaxis.set_label_coords(1.03, -0.02)
+
+            for axes in (plt, plt.frequency_plot):
+                axes.tick_params(axis='both', which='major', labelsize=9)
+                axes.tick_params(axis='both', which='minor', labelsize=7)
+
+            self.plots.append(plt)
+            progress_tick()
+
+    def draw(self):
+        progress_new(len(self.processed_data) + 2)
+        self.create_plots()
+
+        self.create_aux()
+        progress_tick()
+
+        self.canvas.draw()
+        progress_release()
+
+    def _prepare_static_cursor_value(self, data, event):
+        return '(%.3f, rms %.3f, peak %.3f, %.1f Hz)' % (
+            event.xdata,
+            np.interp(event.xdata, data.times, data.rms),
+            np.interp(event.xdata, data.times, data.peak),
+            np.interp(event.xdata, data.times, data.dominant_frequency))
 
 
 # Register
 VISUALIZERS.extend([
     SignalsMapVisualizer,
     SpectreVisualizer,
+    AveragedSpectreVisualizer,
     WaveletsVisualizer,
     SpectrogramVisualizer,
+    TrendsVisualizer,
 ])